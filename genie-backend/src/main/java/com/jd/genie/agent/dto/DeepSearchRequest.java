@@ -13,6 +13,7 @@ import java.util.Map;
 @AllArgsConstructor
 public class DeepSearchRequest {
     private String request_id;
+    private String session_id;
     private String query;
     private String erp;
     private String agent_id;
@@ -80,6 +80,7 @@ public class DeepSearchTool implements BaseTool {
             srcConfig.put("bing", bingConfig);
             DeepSearchRequest request = DeepSearchRequest.builder()
                     .request_id(agentContext.getRequestId() + ":" + StringUtil.generateRandomString(5))
+                    .session_id(agentContext.getSessionId())
                     .query(query)
                     .agent_id("1")
                     .scene_type("auto_agent")
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+"""网页正文抽取 micro-benchmark
+
+对比 bs4 全文抽取与 readability 正文抽取在保存的网页样本上的耗时和输出长度：
+
+    cd genie-tool
+    python -m benchmark.html_extractor_bench --pages benchmark/pages --repeat 50
+
+--pages 可以指向任意保存了 .html 文件的目录。同名的 .expect 文件每行是一句必须出现在正文中的内容，
+recall 列为抽取结果中命中的比例（比较前压缩空白）。
+"""
+import re
+import time
+from optparse import OptionParser
+from pathlib import Path
+
+from genie_tool.tool.search_component.html_extractor import extract_text_bs4, extract_text_readability
+
+
+EXTRACTORS = {
+    "bs4": extract_text_bs4,
+    "readability": extract_text_readability,
+}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text)
+
+
+def recall(text: str, expects: list) -> float:
+    if not expects:
+        return 1.0
+    text = _normalize(text)
+    return sum(_normalize(expect) in text for expect in expects) / len(expects)
+
+
+def bench(pages_dir: str, repeat: int):
+    pages = sorted(Path(pages_dir).glob("*.html"))
+    if not pages:
+        print(f"no html pages in {pages_dir}")
+        return
+    print(f"{'page':<24}{'extractor':<14}{'html_chars':>12}{'text_chars':>12}{'avg_ms':>10}{'recall':>8}")
+    total = {name: [0.0, 0, 0.0] for name in EXTRACTORS}
+    for page in pages:
+        html = page.read_text(encoding="utf-8", errors="ignore")
+        expect_file = page.with_suffix(".expect")
+        expects = [line for line in expect_file.read_text(encoding="utf-8").splitlines() if line.strip()] \
+            if expect_file.exists() else []
+        for name, extractor in EXTRACTORS.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                text = extractor(html)
+            cost = (time.perf_counter() - start) * 1000 / repeat
+            page_recall = recall(text, expects)
+            total[name][0] += cost
+            total[name][1] += len(text)
+            total[name][2] += page_recall
+            print(f"{page.name:<24}{name:<14}{len(html):>12}{len(text):>12}{cost:>10.2f}{page_recall:>8.2f}")
+    print()
+    for name, (cost, chars, recalls) in total.items():
+        print(f"{'TOTAL':<24}{name:<14}{'':>12}{chars:>12}{cost:>10.2f}{recalls / len(pages):>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--pages", dest="pages", type="string", default=str(Path(__file__).parent / "pages"))
+    parser.add_option("--repeat", dest="repeat", type="int", default=50)
+    (options, args) = parser.parse_args()
+    bench(options.pages, options.repeat)
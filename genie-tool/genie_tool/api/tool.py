@@ -18,7 +18,7 @@ from genie_tool.util.file_util import upload_file
 from genie_tool.tool.report import report
 from genie_tool.tool.code_interpreter import code_interpreter_agent
 from genie_tool.util.middleware_util import RequestHandlerRoute
-from genie_tool.tool.deepsearch import DeepSearch
+from genie_tool.tool.deepsearch import DeepSearchSessions
 
 router = APIRouter(route_class=RequestHandlerRoute)
 
@@ -257,16 +257,16 @@ async def post_deepsearch(
     body: DeepSearchRequest,
 ):
     """深度搜索端点"""
-    deepsearch = DeepSearch(engines=body.search_engines)
     async def _stream():
-        async for chunk in deepsearch.run(
-                query=body.query,
-                request_id=body.request_id,
-                max_loop=body.max_loop,
-                stream=True,
-                stream_mode=body.stream_mode,
-        ):
-            yield ServerSentEvent(data=chunk)
+        async with DeepSearchSessions.session(body.session_id, engines=body.search_engines) as deepsearch:
+            async for chunk in deepsearch.run(
+                    query=body.query,
+                    request_id=body.request_id,
+                    max_loop=body.max_loop,
+                    stream=True,
+                    stream_mode=body.stream_mode,
+            ):
+                yield ServerSentEvent(data=chunk)
         yield ServerSentEvent(data="[DONE]")
 
     return EventSourceResponse(_stream(), ping_message_factory=lambda: ServerSentEvent(data="heartbeat"), ping=15)
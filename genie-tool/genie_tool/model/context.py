@@ -6,6 +6,7 @@
 # Date:   2025/7/8
 # =====================
 import contextvars
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -30,6 +31,7 @@ class LLMModelInfo(BaseModel):
     model: str
     context_length: int
     max_output: int
+    tokenizer: Optional[str] = None     # token 计数使用的 tokenizer（litellm 模型名），为空时使用 model
 
 
 class _LLMModelInfoFactory:
@@ -52,6 +54,12 @@ class _LLMModelInfoFactory:
         else:
             return default
 
+    def get_tokenizer(self, model: str) -> Optional[str]:
+        if info := self._factory.get(model):
+            return info.tokenizer or info.model
+        else:
+            return model
+
 
 LLMModelInfoFactory = _LLMModelInfoFactory()
 
@@ -65,6 +65,7 @@ class FileUploadRequest(FileRequest):
 
 class DeepSearchRequest(BaseModel):
     request_id: str = Field(description="Request ID")
+    session_id: Optional[str] = Field(default=None, description="会话 ID，开启会话缓存时同一会话复用已有的搜索结果")
     query: str = Field(description="搜索查询")
     max_loop: Optional[int] = Field(default=1, alias="maxLoop", description="最大循环次数")
 
@@ -8,21 +8,27 @@
 import asyncio
 import json
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 from functools import partial
-from typing import List, AsyncGenerator, Tuple
+from typing import List, AsyncGenerator, Tuple, Dict
 
 from genie_tool.util.log_util import logger
+from genie_tool.util.cache_util import TTLCache
 from genie_tool.util.llm_util import ask_llm
 from genie_tool.model.document import Doc
 from genie_tool.util.log_util import timer
-from genie_tool.tool.search_component.query_process import query_decompose
-from genie_tool.tool.search_component.answer import answer_question
+from genie_tool.tool.search_component.query_process import query_decompose, query_decompose_stream, is_similar_query
+from genie_tool.tool.search_component.answer import answer_question, answer_question_map_reduce
 from genie_tool.tool.search_component.reasoning import search_reasoning
 from genie_tool.tool.search_component.search_engine import MixSearch
+from genie_tool.tool.search_component.dedup import NearDuplicateIndex
+from genie_tool.tool.search_component.doc_critic import doc_critic
+from genie_tool.tool.search_component.ranking import rank_and_pack
+from genie_tool.tool.search_component.context_builder import DocContextBuilder, render_docs
 from genie_tool.model.protocal import StreamMode
-from genie_tool.util.file_util import truncate_files
 from genie_tool.model.context import LLMModelInfoFactory
+from genie_tool.util.file_util import truncate_files
+from genie_tool.util.token_util import count_tokens
 
 
 class DeepSearch:
@@ -37,16 +43,44 @@ class DeepSearch:
         use_serp = "serp" in engines
         self._search_single_query = partial(
             MixSearch().search_and_dedup, use_bing=use_bing, use_jina=use_jina, use_sogou=use_sogou, use_serp=use_serp)
+        self._search_semaphore = asyncio.Semaphore(
+            int(os.getenv("SEARCH_CONCURRENCY", os.getenv("SEARCH_THREAD_NUM", 5))))
+        self._dedup_index = NearDuplicateIndex()
+        self._pipeline = os.getenv("DEEPSEARCH_PIPELINE", "false") == "true"
+        self._stream_decompose = os.getenv("QUERY_DECOMPOSE_STREAM", "false") == "true"
+        self._rank = os.getenv("DEEPSEARCH_RANK_ENABLE", "false") == "true"
+        self._speculative_answer = os.getenv("DEEPSEARCH_SPECULATIVE_ANSWER", "false") == "true"
+        self._refine_mode = os.getenv("DEEPSEARCH_REFINE_MODE", "")
+        self._min_new_docs = int(os.getenv("DEEPSEARCH_MIN_NEW_DOCS", 1))
+        self._min_new_tokens = int(os.getenv("DEEPSEARCH_MIN_NEW_TOKENS", 0))
+        self._doc_critic = os.getenv("DOC_CRITIC_ENABLE", "false") == "true"
+        self._incremental_reasoning = os.getenv("SEARCH_REASONING_INCREMENTAL", "false") == "true"
+        self._map_reduce_answer = os.getenv("SEARCH_ANSWER_MAP_REDUCE", "false") == "true"
         self.searched_queries = []
         self.current_docs = []
+        # 增量推理评估累积的信息摘要
+        self.reasoning_summary = ""
+        # 当前请求新增文档的起始位置：会话复用时这些文档优先进入上下文
+        self._request_docs_start = 0
+        self._context = DocContextBuilder(self.current_docs)
+
+    def memory_size(self) -> int:
+        """会话缓存按此估算占用内存（字节）"""
+        return sum(len(doc.content.encode("utf-8")) for doc in self.current_docs) \
+            + self._context.memory_size() + self._dedup_index.memory_size()
 
-    def search_docs_str(self, model: str = None) -> str:
-        current_docs_str = ""
-        max_tokens = LLMModelInfoFactory.get_context_length(model)
-        truncate_docs = truncate_files(self.current_docs, max_tokens=int(max_tokens * 0.8)) if model else self.current_docs
-        for i, doc in enumerate(truncate_docs, start=1):
-            current_docs_str += f"文档编号〔{i}〕. \n{doc.to_html()}\n"
-        return current_docs_str
+    def search_docs_str(self, model: str = None, query: str = None) -> str:
+        max_tokens = int(LLMModelInfoFactory.get_context_length(model) * 0.8)
+        if model and query and self._rank:
+            # 按与 query / 子查询的相关性挑选 passage 填充上下文
+            return render_docs(rank_and_pack(
+                self.current_docs, query=query, sub_queries=self.searched_queries, max_tokens=max_tokens, model=model))
+        return self._context.build(model, max_tokens if model else None, start=self._request_docs_start)
+
+    def _new_docs_str(self, new_docs: List[Doc]) -> str:
+        model = os.getenv("SEARCH_REASONING_MODEL")
+        max_tokens = int(os.getenv("SEARCH_REASONING_NEW_DOCS_TOKENS", 32000))
+        return render_docs(truncate_files(new_docs, max_tokens=max_tokens, model=model))
 
     @timer()
     async def run(
@@ -61,74 +95,137 @@ class DeepSearch:
     ) -> AsyncGenerator[str, None]:
         """深度搜索回复（流式）"""
 
+        # 会话复用时只保留已搜索的子查询和文档，信息摘要针对的是之前的问题，每次请求重新累积
+        self.reasoning_summary = ""
+        self._request_docs_start = len(self.current_docs)
         current_loop = 1
+        answer_task, answer_queue = None, None
+        reasoning_result = {}
         # 执行深度搜索循环
         while current_loop <= max_loop:
             logger.info(f"{request_id} 第 {current_loop} 轮深度搜索...")
-            # 查询分解
-            sub_queries = await query_decompose(query=query)
-
-            yield json.dumps({
-                "requestId": request_id,
-                "query": query,
-                "searchResult": {"query": sub_queries, "docs": [[]] * len(sub_queries)},
-                "isFinal": False,
-                "messageType": "extend"
-            }, ensure_ascii=False)
-
-            await asyncio.sleep(0.1)
-
-            # 去除已经检索过的query
-            sub_queries = [sub_query for sub_query in sub_queries
-                           if sub_query not in self.searched_queries]
-            # 并行搜索并去重
-            searched_docs, docs_list = await self._search_queries_and_dedup(
-                queries=sub_queries,
-                request_id=request_id,
-            )
+            docs_before = len(self.current_docs)
+            # 查询分解；流式分解时每解析出一个子查询立即开始搜索
+            sub_queries, search_tasks, critic_tasks = [], {}, {}
+            # 分解异常、客户端断开（yield 处 GeneratorExit）或某个搜索失败时，取消尚未完成的搜索，避免继续调用搜索接口
+            try:
+                async for sub_query in self._decompose(query, reasoning_result):
+                    sub_queries.append(sub_query)
+                    if self._stream_decompose and self._is_new_query(sub_query, search_tasks):
+                        search_tasks[sub_query] = self._start_search(sub_query, request_id)
 
-            truncate_len = int(os.getenv("SINGLE_PAGE_MAX_SIZE", 200))
-            yield json.dumps(
-                {
+                yield json.dumps({
                     "requestId": request_id,
                     "query": query,
-                    "searchResult": {
-                        "query": sub_queries,
-                        "docs": [[d.to_dict(truncate_len=truncate_len) for d in docs_l] for docs_l in docs_list]
-                    },
+                    "searchResult": {"query": sub_queries, "docs": [[]] * len(sub_queries)},
                     "isFinal": False,
-                    "messageType": "search"
+                    "messageType": "extend"
                 }, ensure_ascii=False)
 
-            # 更新上下文
-            self.current_docs.extend(searched_docs)
-            self.searched_queries.extend(sub_queries)
+                await asyncio.sleep(0.1)
+
+                # 去除已经检索过（或近似重复）的query
+                for sub_query in sub_queries:
+                    if sub_query not in search_tasks and self._is_new_query(sub_query, search_tasks):
+                        search_tasks[sub_query] = self._start_search(sub_query, request_id)
+
+                if self._pipeline:
+                    # 流水线模式：每个子查询完成后立即推送并加入上下文。search 消息携带截至目前已完成的全部子查询，
+                    # 下游按最后一条 search 消息覆盖搜索结果
+                    done_queries, done_docs_list = [], []
+                    async for sub_query, docs, deduped_docs in self._search_queries_as_completed(
+                            search_tasks=search_tasks,
+                            request_id=request_id,
+                    ):
+                        done_queries.append(sub_query)
+                        done_docs_list.append(docs)
+                        yield self._search_message(request_id, query, done_queries, done_docs_list)
+                        if self._doc_critic:
+                            # doc critic 在后台并发执行，不阻塞后续子查询的 search 消息
+                            critic_tasks[sub_query] = asyncio.create_task(
+                                doc_critic(query, deduped_docs, request_id))
+                        else:
+                            self.current_docs.extend(deduped_docs)
+                            self.searched_queries.append(sub_query)
+                    for sub_query, task in critic_tasks.items():
+                        self.current_docs.extend(await task)
+                        self.searched_queries.append(sub_query)
+                else:
+                    # 并行搜索并去重
+                    searched_docs, docs_list = await self._search_queries_and_dedup(
+                        search_tasks=search_tasks,
+                        request_id=request_id,
+                    )
+                    yield self._search_message(request_id, query, list(search_tasks), docs_list)
+
+                    # 更新上下文，开启 doc critic 时只保留与 query 相关的文档
+                    if self._doc_critic:
+                        searched_docs = await doc_critic(query, searched_docs, request_id)
+                    self.current_docs.extend(searched_docs)
+                    self.searched_queries.extend(search_tasks)
+            finally:
+                for task in [*search_tasks.values(), *critic_tasks.values()]:
+                    task.cancel()
 
             # 如果是最后一轮，直接跳出
             if current_loop == max_loop:
                 break
 
-            # 推理验证是否需要继续搜索
-            reasoning_result = search_reasoning(
-                request_id=request_id,
-                query=query,
-                content=self.search_docs_str(os.getenv("SEARCH_REASONING_MODEL")),
-            )
+            # 本轮新增的（去重后）文档太少，继续搜索收益很低，不再调用推理评估
+            if current_loop > 1 and not self._is_novel(self.current_docs[docs_before:], request_id):
+                break
+
+            # 投机生成答案：与推理并行，推理判断需要继续搜索时丢弃
+            if self._speculative_answer:
+                answer_queue = asyncio.Queue()
+                answer_task = asyncio.create_task(self._buffer_answer(query, request_id, answer_queue))
+
+            # 推理验证是否需要继续搜索；增量模式只发送本轮新增的文档和之前的信息摘要
+            try:
+                if self._incremental_reasoning:
+                    reasoning_result = await search_reasoning(
+                        request_id=request_id,
+                        query=query,
+                        content=self._new_docs_str(self.current_docs[docs_before:]),
+                        history_query_list=self.searched_queries,
+                        summary=self.reasoning_summary,
+                        need_reason=self._refine_mode == "history",
+                    )
+                    self.reasoning_summary = reasoning_result.get("summary") or self.reasoning_summary
+                else:
+                    reasoning_result = await search_reasoning(
+                        request_id=request_id,
+                        query=query,
+                        content=self.search_docs_str(os.getenv("SEARCH_REASONING_MODEL"), query),
+                        history_query_list=self.searched_queries,
+                        need_reason=self._refine_mode == "history",
+                    )
+            except BaseException:
+                if answer_task:
+                    answer_task.cancel()
+                raise
 
             # 如果推理判断已经可以回答，跳出循环
             if reasoning_result.get("is_verify", "1") in ["1", 1]:
                 logger.info(f"{request_id} reasoning 判断没有得到新的查询，流程结束")
                 break
 
+            if answer_task:
+                logger.info(f"{request_id} reasoning 判断需要继续搜索，丢弃投机生成的答案")
+                answer_task.cancel()
+                answer_task = None
+
             current_loop += 1
 
         # 生成最终答案
         answer = ""
         acc_content = ""
         acc_token = 0
-        async for chunk in answer_question(
-                query=query, search_content=self.search_docs_str(os.getenv("SEARCH_ANSWER_MODEL"))
-        ):
+        if answer_task:
+            answer_chunks = self._drain_answer(answer_task, answer_queue)
+        else:
+            answer_chunks = self._answer_stream(query, request_id)
+        async for chunk in answer_chunks:
             if stream:
                 if acc_token >= stream_mode.token:
                     yield json.dumps({
@@ -171,31 +268,174 @@ class DeepSearch:
                 "messageType": "report"
             }, ensure_ascii=False)
 
+    async def _decompose(self, query: str, reasoning_result: dict) -> AsyncGenerator[str, None]:
+        """生成本轮子查询
+
+        第一轮（或未开启 DEEPSEARCH_REFINE_MODE）按原始 query 分解；之后的轮次：
+        rewrite 模式直接使用推理评估给出的 rewrite_query，不再调用分解；history 模式分解时带上已覆盖的子查询和评估结论。
+        """
+        if reasoning_result and self._refine_mode == "rewrite" and (rewrite := reasoning_result.get("rewrite_query")):
+            yield rewrite
+            return
+        retrieval_str = ""
+        if reasoning_result and self._refine_mode in ("rewrite", "history"):
+            lines = [
+                ("已检索的子查询", "；".join(self.searched_queries)),
+                ("评估结论", reasoning_result.get("reason", "")),
+                ("待补充的信息", reasoning_result.get("rewrite_query", "")),
+            ]
+            retrieval_str = "\n".join(f"{name}：{value}" for name, value in lines if value)
+        # 只有第一轮使用分解缓存：后续轮次的 key 与第一轮相同，命中会得到已检索过的子查询
+        use_cache = not reasoning_result
+        if self._stream_decompose:
+            async for sub_query in query_decompose_stream(
+                    query=query, retrieval_str=retrieval_str, use_cache=use_cache):
+                yield sub_query
+        else:
+            for sub_query in await query_decompose(query=query, retrieval_str=retrieval_str, use_cache=use_cache):
+                yield sub_query
+
+    def _is_novel(self, new_docs: List[Doc], request_id: str) -> bool:
+        new_tokens = sum(count_tokens(doc.content) for doc in new_docs)
+        if len(new_docs) < self._min_new_docs or new_tokens < self._min_new_tokens:
+            logger.info(f"{request_id} 本轮新增 {len(new_docs)} 篇文档 / {new_tokens} tokens，低于阈值，流程结束")
+            return False
+        return True
+
+    def _is_new_query(self, sub_query: str, search_tasks: Dict[str, asyncio.Task]) -> bool:
+        """与已检索和本轮已开始检索的子查询都不近似重复"""
+        return not is_similar_query(sub_query, self.searched_queries + list(search_tasks))
+
+    def _answer_stream(self, query: str, request_id: str) -> AsyncGenerator[str, None]:
+        """文档超出答案模型上下文预算且开启 SEARCH_ANSWER_MAP_REDUCE 时使用 map-reduce，否则截断后直接生成"""
+        model = os.getenv("SEARCH_ANSWER_MODEL")
+        if self._map_reduce_answer and \
+                self._context.tokens(model) > int(LLMModelInfoFactory.get_context_length(model) * 0.8):
+            return answer_question_map_reduce(query=query, docs=list(self.current_docs), request_id=request_id)
+        return answer_question(query=query, search_content=self.search_docs_str(model, query))
+
+    async def _buffer_answer(self, query: str, request_id: str, queue: asyncio.Queue):
+        """生成答案并写入队列，结束时写入 None"""
+        try:
+            async for chunk in self._answer_stream(query, request_id):
+                queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(None)
+
+    @staticmethod
+    async def _drain_answer(task: asyncio.Task, queue: asyncio.Queue) -> AsyncGenerator[str, None]:
+        """读取投机生成的答案，生成失败时抛出原异常"""
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            await task
+        finally:
+            task.cancel()
+
+    @staticmethod
+    def _search_message(request_id: str, query: str, sub_queries: List[str], docs_list: List[List[Doc]]) -> str:
+        truncate_len = int(os.getenv("SINGLE_PAGE_MAX_SIZE", 200))
+        return json.dumps(
+            {
+                "requestId": request_id,
+                "query": query,
+                "searchResult": {
+                    "query": sub_queries,
+                    "docs": [[d.to_dict(truncate_len=truncate_len) for d in docs_l] for docs_l in docs_list]
+                },
+                "isFinal": False,
+                "messageType": "search"
+            }, ensure_ascii=False)
+
+    @staticmethod
+    def _mark_query(query: str, docs: List[Doc]) -> List[Doc]:
+        """记录文档来自哪个子查询，供相关性排序使用"""
+        for doc in docs:
+            doc.data.setdefault("query", query)
+        return docs
+
+    def _start_search(self, query: str, request_id: str) -> asyncio.Task:
+        """在当前事件循环上启动单个子查询的搜索，并发数由 SEARCH_CONCURRENCY 限制"""
+        async def _search() -> List[Doc]:
+            async with self._search_semaphore:
+                return await self._search_single_query(query, request_id)
+        return asyncio.create_task(_search())
+
+    async def _search_queries_as_completed(
+            self,
+            search_tasks: Dict[str, asyncio.Task],
+            request_id: str,
+    ) -> AsyncGenerator[Tuple[str, List[Doc], List[Doc]], None]:
+        """按完成顺序返回 (子查询, 搜索结果, 去重后新增的文档)"""
+        async def _wait(query: str, task: asyncio.Task) -> Tuple[str, List[Doc]]:
+            return query, self._mark_query(query, await task)
+
+        try:
+            for future in asyncio.as_completed([_wait(query, task) for query, task in search_tasks.items()]):
+                query, docs = await future
+                deduped_docs = self._dedup_index.dedup(docs)
+                logger.info(f"{request_id} sub query [{query}] done: {len(docs)} -> {len(deduped_docs)} docs, "
+                            f"total {self._dedup_index.stats()}")
+                yield query, docs, deduped_docs
+        finally:
+            for task in search_tasks.values():
+                task.cancel()
+
     async def _search_queries_and_dedup(
             self,
-            queries: List[str],
+            search_tasks: Dict[str, asyncio.Task],
             request_id: str,
     ) -> Tuple[List[Doc], List[List[Doc]]]:
-        """异步并行搜索多个查询并去重"""
-        def _run_async(*args, **kwargs):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            s_result = loop.run_until_complete(self._search_single_query(*args, **kwargs))
-            loop.close()
-            return s_result
-
-        process_list = []
-        with ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_THREAD_NUM", 5))) as executor:
-            for query in queries:
-                process = executor.submit(_run_async, query, request_id)
-                process_list.append(process)
-        results = [process.result() for process in as_completed(process_list)]
+        """等待全部子查询搜索完成并去重，结果顺序与 search_tasks 保持一致"""
+        results = [self._mark_query(query, docs)
+                   for query, docs in zip(search_tasks, await asyncio.gather(*search_tasks.values()))]
         all_docs = [doc for docs in results for doc in docs]
-        # 去重
-        seen_content = set()
-        deduped_docs = []
-        for doc in all_docs:
-            if doc.content and doc.content not in seen_content:
-                deduped_docs.append(doc)
-                seen_content.add(doc.content)
-        return deduped_docs, results
+        # 近似去重：跨引擎、跨子查询、跨轮次
+        deduped_docs = self._dedup_index.dedup(all_docs)
+        logger.info(f"{request_id} near-duplicate dedup: {len(all_docs)} -> {len(deduped_docs)} docs, "
+                    f"total {self._dedup_index.stats()}")
+        return deduped_docs, list(results)
+
+
+class _DeepSearchSessionStore(object):
+    """DeepSearch 会话缓存（DEEPSEARCH_SESSION_ENABLE=true 时生效）
+
+    同一会话的后续请求复用 searched_queries、已抓取的文档、去重索引和渲染好的上下文，只搜索新的子查询。
+    按最近一次请求计算 TTL，并限制会话数和总内存；同一会话的请求串行执行。
+    """
+
+    def __init__(self):
+        self.enable = os.getenv("DEEPSEARCH_SESSION_ENABLE", "false") == "true"
+        self._cache = TTLCache(
+            name="deepsearch_session",
+            ttl=int(os.getenv("DEEPSEARCH_SESSION_TTL", 1800)),
+            max_size=int(os.getenv("DEEPSEARCH_SESSION_MAX_SIZE", 200)),
+            max_bytes=int(os.getenv("DEEPSEARCH_SESSION_MAX_BYTES", 256 * 1024 * 1024)),
+            sizeof=lambda session: session[0].memory_size(),
+            enable=self.enable,
+        )
+        self._creating = asyncio.Lock()
+
+    @asynccontextmanager
+    async def session(self, session_id: str = None, engines: List[str] = []) -> AsyncGenerator[DeepSearch, None]:
+        if not self.enable or not session_id:
+            yield DeepSearch(engines=engines)
+            return
+        # 搜索引擎配置不同的请求不共享状态
+        key = f"{session_id}:{','.join(sorted(engines))}"
+        async with self._creating:
+            if (session := await self._cache.get(key)) is None:
+                session = (DeepSearch(engines=engines), asyncio.Lock())
+                await self._cache.set(key, session)
+        deepsearch, lock = session
+        async with lock:
+            logger.info(f"deepsearch session [{session_id}] reuse {len(deepsearch.searched_queries)} queries, "
+                        f"{len(deepsearch.current_docs)} docs")
+            try:
+                yield deepsearch
+            finally:
+                # 重新写入以刷新 TTL 和内存占用
+                await self._cache.set(key, session)
+
+
+DeepSearchSessions = _DeepSearchSessionStore()
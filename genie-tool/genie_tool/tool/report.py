@@ -17,6 +17,7 @@ from genie_tool.util.file_util import download_all_files, truncate_files, flatte
 from genie_tool.util.prompt_util import get_prompt
 from genie_tool.util.llm_util import ask_llm
 from genie_tool.util.log_util import timer
+from genie_tool.util.token_util import count_tokens
 from genie_tool.model.context import LLMModelInfoFactory
 
 load_dotenv()
@@ -60,7 +61,8 @@ async def ppt_report(
         else:
             flat_files.append(f)
 
-    truncate_flat_files = truncate_files(flat_files, max_tokens=int(LLMModelInfoFactory.get_context_length(model) * 0.8))
+    truncate_flat_files = truncate_files(
+        flat_files, max_tokens=int(LLMModelInfoFactory.get_context_length(model) * 0.8), model=model)
     prompt = Template(get_prompt("report")["ppt_prompt"]) \
         .render(task=task, files=truncate_flat_files, date=datetime.now().strftime("%Y-%m-%d"))
 
@@ -86,7 +88,8 @@ async def markdown_report(
         else:
             flat_files.append(f)
 
-    truncate_flat_files = truncate_files(flat_files, max_tokens=int(LLMModelInfoFactory.get_context_length(model) * 0.8))
+    truncate_flat_files = truncate_files(
+        flat_files, max_tokens=int(LLMModelInfoFactory.get_context_length(model) * 0.8), model=model)
     prompt = Template(get_prompt("report")["markdown_prompt"]) \
         .render(task=task, files=truncate_flat_files, current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
@@ -135,8 +138,9 @@ async def html_report(
                     "link": fpath
                 })
     discount = int(LLMModelInfoFactory.get_context_length(model) * 0.8)
-    key_files = truncate_files(key_files, max_tokens=discount)
-    flat_files = truncate_files(flat_files, max_tokens=discount - sum([len(f["content"]) for f in key_files]))
+    key_files = truncate_files(key_files, max_tokens=discount, model=model)
+    flat_files = truncate_files(
+        flat_files, max_tokens=discount - sum([count_tokens(f["content"], model) for f in key_files]), model=model)
 
     report_prompts = get_prompt("report")
     prompt = Template(report_prompts["html_task"]) \
@@ -5,12 +5,32 @@
 # Author: liumin.423
 # Date:   2025/7/9
 # =====================
+import asyncio
+import hashlib
 import os
 import time
+from dataclasses import replace
+from typing import List
 
+from loguru import logger
+
+from genie_tool.model.context import LLMModelInfoFactory
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.context_builder import render_doc
+from genie_tool.util.cache_util import TTLCache, normalize_query
 from genie_tool.util.llm_util import ask_llm
 from genie_tool.util.log_util import timer
 from genie_tool.util.prompt_util import get_prompt
+from genie_tool.util.token_util import count_tokens, truncate_tokens
+
+
+# map 阶段分组摘要缓存：key 为 模型 + 归一化 query + 分组内容的 hash
+AnswerMapCache = TTLCache(
+    name="answer_map",
+    ttl=int(os.getenv("SEARCH_ANSWER_MAP_CACHE_TTL", 3600)),
+    max_size=int(os.getenv("SEARCH_ANSWER_MAP_CACHE_MAX_SIZE", 2000)),
+    disk_path=os.getenv("SEARCH_ANSWER_MAP_CACHE_DISK_PATH") or None,
+)
 
 
 @timer()
@@ -36,5 +56,75 @@ async def answer_question(query: str, search_content: str):
             yield chunk
 
 
+@timer()
+async def answer_question_map_reduce(query: str, docs: List[Doc], request_id: str = None):
+    """文档超出上下文时的 map-reduce 答案生成
+
+    map：按 SEARCH_ANSWER_MAP_GROUP_TOKENS 将文档（保持全局文档编号）分组，并发提取每组与问题相关的信息并标注引用；
+    reduce：将各组摘要作为检索内容生成最终答案。
+    """
+    model = os.getenv("SEARCH_ANSWER_MAP_MODEL") or os.getenv("SEARCH_ANSWER_MODEL", "gpt-4.1")
+    groups = _group_docs(docs, int(os.getenv("SEARCH_ANSWER_MAP_GROUP_TOKENS", 32000)), model)
+    semaphore = asyncio.Semaphore(int(os.getenv("SEARCH_ANSWER_MAP_CONCURRENCY", 5)))
+    summaries = await asyncio.gather(*[_map_group(query, group, model, semaphore, request_id) for group in groups])
+    logger.info(f"{request_id} answer map-reduce: {len(docs)} docs -> {len(groups)} groups, "
+                f"cache={AnswerMapCache.stats()}")
+
+    answer_model = os.getenv("SEARCH_ANSWER_MODEL", "gpt-4.1")
+    search_content = truncate_tokens(
+        "\n\n".join(summary for summary in summaries if summary),
+        int(LLMModelInfoFactory.get_context_length(answer_model) * 0.8),
+        answer_model,
+    )
+    async for chunk in answer_question(query=query, search_content=search_content):
+        yield chunk
+
+
+def _group_docs(docs: List[Doc], group_tokens: int, model: str) -> List[str]:
+    """按 token 数将渲染后的文档分组，单篇超出分组大小时截断正文"""
+    groups, parts, tokens = [], [], 0
+    for i, doc in enumerate(docs, start=1):
+        fragment = render_doc(i, doc)
+        fragment_tokens = count_tokens(fragment, model)
+        if fragment_tokens > group_tokens:
+            overhead = count_tokens(render_doc(i, replace(doc, content="")), model)
+            fragment = render_doc(i, replace(doc, content=truncate_tokens(
+                doc.content, max(group_tokens - overhead, 0), model)))
+            fragment_tokens = group_tokens
+        if parts and tokens + fragment_tokens > group_tokens:
+            groups.append("".join(parts))
+            parts, tokens = [], 0
+        parts.append(fragment)
+        tokens += fragment_tokens
+    if parts:
+        groups.append("".join(parts))
+    return groups
+
+
+async def _map_group(query: str, group: str, model: str, semaphore: asyncio.Semaphore, request_id: str) -> str:
+    key = hashlib.md5(f"{model}:{normalize_query(query)}:{group}".encode("utf-8")).hexdigest()
+    if (cached := await AnswerMapCache.get(key)) is not None:
+        return cached
+
+    # 摘要长度按字数计（与 prompt 中的“不超过 N 字”一致）
+    summary_length = int(os.getenv("SEARCH_ANSWER_MAP_SUMMARY_LENGTH", 2000))
+    prompt = get_prompt("deepsearch")["answer_map_prompt"].format(
+        summary_length=summary_length,
+        query=query,
+        docs=group,
+    )
+    try:
+        async with semaphore:
+            summary = ""
+            async for chunk in ask_llm(messages=prompt, model=model, stream=False, only_content=True):
+                summary += chunk or ""
+    except Exception as e:
+        # 单组失败时直接使用截断后的原文，不丢失引用
+        logger.warning(f"{request_id} answer map error: {e}")
+        return group[:summary_length]
+    await AnswerMapCache.set(key, summary)
+    return summary
+
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+from bisect import bisect_right
+from dataclasses import replace
+from typing import List, Dict, Optional, Tuple
+
+from genie_tool.model.document import Doc
+from genie_tool.util.token_util import count_tokens, truncate_tokens
+
+
+def render_doc(index: int, doc: Doc) -> str:
+    return f"文档编号〔{index}〕. \n{doc.to_html()}\n"
+
+
+def render_docs(docs: List[Doc]) -> str:
+    return "".join(render_doc(i, doc) for i, doc in enumerate(docs, start=1))
+
+
+class DocContextBuilder(object):
+    """DeepSearch 文档上下文构建
+
+    docs 只会追加，第 i 篇文档的编号固定，因此每篇文档只渲染一次并缓存片段，按模型缓存片段 token 数的前缀和。
+    构建时二分找到预算内的最后一篇完整文档，只对被截断的那一篇重新渲染，其余直接拼接缓存的片段。
+    会话复用时可指定 start，让当前请求新增的文档优先进入上下文。
+    """
+
+    def __init__(self, docs: List[Doc]):
+        self._docs = docs
+        self._fragments: List[str] = []
+        self._cumulative_tokens: Dict[str, List[int]] = {}
+
+    def memory_size(self) -> int:
+        return sum(len(fragment.encode("utf-8")) for fragment in self._fragments)
+
+    def _render(self):
+        if len(self._docs) < len(self._fragments):
+            # docs 被外部删改，重新渲染
+            self._fragments.clear()
+            self._cumulative_tokens.clear()
+        for i in range(len(self._fragments), len(self._docs)):
+            self._fragments.append(render_doc(i + 1, self._docs[i]))
+
+    def _cumulative(self, model: str) -> List[int]:
+        cumulative = self._cumulative_tokens.setdefault(model, [0])
+        for fragment in self._fragments[len(cumulative) - 1:]:
+            cumulative.append(cumulative[-1] + count_tokens(fragment, model))
+        return cumulative
+
+    def tokens(self, model: Optional[str] = None) -> int:
+        """完整上下文的 token 数"""
+        self._render()
+        return self._cumulative(model)[-1]
+
+    def build(self, model: Optional[str] = None, max_tokens: Optional[int] = None, start: int = 0) -> str:
+        """拼接文档上下文，max_tokens 为空时不截断
+
+        start 之后的文档（如会话中当前请求新搜到的文档）优先占用预算，剩余预算再按顺序放入 start 之前的文档；
+        文档编号保持不变。
+        """
+        self._render()
+        if max_tokens is None:
+            return "".join(self._fragments)
+
+        start = min(start, len(self._fragments))
+        new_part, used = self._build_range(model, start, len(self._fragments), max_tokens)
+        old_part, _ = self._build_range(model, 0, start, max_tokens - used)
+        return new_part + old_part
+
+    def _build_range(self, model: Optional[str], begin: int, end: int, max_tokens: int) -> Tuple[str, int]:
+        """在 max_tokens 内拼接 [begin, end) 的文档，返回 (上下文, 占用的 token 数)"""
+        if begin >= end or max_tokens <= 0:
+            return "", 0
+        cumulative = self._cumulative(model)
+        stop = bisect_right(cumulative, cumulative[begin] + max_tokens, lo=begin, hi=end + 1) - 1
+        parts = self._fragments[begin:stop]
+        used = cumulative[stop] - cumulative[begin]
+        if stop < end and (remain := max_tokens - used) > 0:
+            doc = self._docs[stop]
+            overhead = count_tokens(render_doc(stop + 1, replace(doc, content="")), model)
+            if remain > overhead:
+                content = truncate_tokens(doc.content, remain - overhead, model)
+                parts.append(render_doc(stop + 1, replace(doc, content=content)))
+                used = max_tokens
+        return "".join(parts), used
+
+if __name__ == "__main__":
+    pass
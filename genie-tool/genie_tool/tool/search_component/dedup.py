@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import hashlib
+import os
+import re
+from typing import List
+
+import numpy as np
+
+from genie_tool.model.document import Doc
+from genie_tool.util.token_util import count_tokens
+
+
+_BITS = 64
+_PRIME = np.uint64(1099511628211)
+_SIMHASH_CHUNK = 65536
+_NORMALIZE_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def shingle_hashes(text: str, shingle_size: int = 4) -> np.ndarray:
+    """字符 shingle 的 64 位 hash（去重并排序）
+
+    对码点做多项式滚动 hash 再经 splitmix64 混合，不使用内置 hash()（按进程加盐），保证跨进程 / 跨 worker 稳定。
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    size = min(shingle_size, len(codes))
+    count = len(codes) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for i in range(size):
+        hashes = hashes * _PRIME + codes[i: i + count]
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= np.uint64(0xBF58476D1CE4E5B9)
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= np.uint64(0x94D049BB133111EB)
+    hashes ^= hashes >> np.uint64(31)
+    # 排序后去掉相邻重复（比 np.unique 快）
+    hashes.sort()
+    return hashes[np.concatenate(([True], hashes[1:] != hashes[:-1]))]
+
+
+def simhash(hashes: np.ndarray) -> int:
+    """由 shingle hash 计算 64 位 SimHash（对中文无需分词）；分块展开比特位计数，内存占用与正文长度无关"""
+    ones = np.zeros(_BITS, dtype=np.int64)
+    for start in range(0, len(hashes), _SIMHASH_CHUNK):
+        chunk = hashes[start: start + _SIMHASH_CHUNK].astype("<u8").view(np.uint8).reshape(-1, 8)
+        ones += np.unpackbits(chunk, axis=1, bitorder="little").sum(axis=0, dtype=np.int64)
+    return int(sum(1 << i for i in np.nonzero(ones * 2 > len(hashes))[0].tolist()))
+
+
+def jaccard(a: np.ndarray, b: np.ndarray, sketch_size: int) -> float:
+    """由 bottom-k 签名（各自最小的 sketch_size 个 shingle hash，已排序）估计 Jaccard 相似度；集合较小时为精确值"""
+    union = np.union1d(a, b)[:sketch_size]
+    if not len(union):
+        return 1.0
+    both = np.intersect1d(a, b, assume_unique=True)
+    return len(np.intersect1d(union, both, assume_unique=True)) / len(union)
+
+
+def exact_dedup(docs: List[Doc]) -> List[Doc]:
+    """过滤空文档和归一化后正文完全相同的文档"""
+    seen, deduped_docs = set(), []
+    for doc in docs:
+        if not doc.content:
+            continue
+        digest = hashlib.md5(_NORMALIZE_PATTERN.sub("", doc.content.lower()).encode("utf-8")).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            deduped_docs.append(doc)
+    return deduped_docs
+
+
+class NearDuplicateIndex(object):
+    """近似重复文档索引
+
+    对归一化后的正文计算 SimHash，汉明距离不超过 max_distance 的文档作为候选，再以 shingle 集合的 Jaccard
+    相似度不低于 min_jaccard 确认重复。短页面（几百字）上插入时间戳等少量改动的 SimHash 距离可达 8~10，
+    只靠汉明距离阈值无法与内容不同的页面区分，因此 SimHash 只负责召回。按鸽巢原理将 64 位指纹切分为
+    max_distance + 1 段建立倒排，只与至少有一段完全相同的候选比较。短文本只做精确去重。
+    每篇文档只保存 sketch_size 个最小的 shingle hash（bottom-k 签名）用于估计 Jaccard，内存不随正文长度增长。
+    """
+
+    def __init__(
+            self, max_distance: int = None, shingle_size: int = None, min_length: int = None,
+            min_jaccard: float = None, sketch_size: int = None,
+    ):
+        self._max_distance = int(os.getenv("SEARCH_DEDUP_MAX_DISTANCE", 10)) if max_distance is None else max_distance
+        self._shingle_size = int(os.getenv("SEARCH_DEDUP_SHINGLE_SIZE", 4)) if shingle_size is None else shingle_size
+        self._min_length = int(os.getenv("SEARCH_DEDUP_MIN_LENGTH", 50)) if min_length is None else min_length
+        self._min_jaccard = float(os.getenv("SEARCH_DEDUP_MIN_JACCARD", 0.8)) if min_jaccard is None else min_jaccard
+        self._sketch_size = int(os.getenv("SEARCH_DEDUP_SKETCH_SIZE", 256)) if sketch_size is None else sketch_size
+        self._bands = min(self._max_distance + 1, _BITS)
+        self._band_bits = _BITS // self._bands
+        self._exact = set()
+        self._buckets: List[dict[int, List[int]]] = [{} for _ in range(self._bands)]
+        # 已加入文档的 (指纹, bottom-k 签名)，倒排中保存下标
+        self._entries: List[tuple[int, np.ndarray]] = []
+        self.removed_docs = 0
+        self.removed_tokens = 0
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self._band_bits) - 1
+        return [(fingerprint >> (i * self._band_bits)) & mask for i in range(self._bands)]
+
+    def add(self, content: str) -> bool:
+        """加入索引，若与已有内容重复返回 False"""
+        text = _NORMALIZE_PATTERN.sub("", content.lower())
+        digest = hashlib.md5(text.encode("utf-8")).hexdigest()
+        if digest in self._exact:
+            return False
+        if len(text) >= self._min_length:
+            hashes = shingle_hashes(text, self._shingle_size)
+            fingerprint = simhash(hashes)
+            sketch = hashes[: self._sketch_size].copy()
+            band_keys = self._band_keys(fingerprint)
+            candidates = {i for bucket, band_key in zip(self._buckets, band_keys) for i in bucket.get(band_key, [])}
+            for i in candidates:
+                candidate, candidate_sketch = self._entries[i]
+                if (candidate ^ fingerprint).bit_count() <= self._max_distance \
+                        and jaccard(sketch, candidate_sketch, self._sketch_size) >= self._min_jaccard:
+                    return False
+            for bucket, band_key in zip(self._buckets, band_keys):
+                bucket.setdefault(band_key, []).append(len(self._entries))
+            self._entries.append((fingerprint, sketch))
+        self._exact.add(digest)
+        return True
+
+    def dedup(self, docs: List[Doc]) -> List[Doc]:
+        """过滤空文档和近似重复文档，并累计去掉的文档数 / token 数"""
+        deduped_docs = []
+        for doc in docs:
+            if not doc.content:
+                continue
+            if self.add(doc.content):
+                deduped_docs.append(doc)
+            else:
+                self.removed_docs += 1
+                self.removed_tokens += count_tokens(doc.content)
+        return deduped_docs
+
+    def memory_size(self) -> int:
+        """估算占用内存（字节）：签名数组 + 指纹 / 倒排下标 + 精确去重的 md5"""
+        sketch_bytes = sum(sketch.nbytes for _, sketch in self._entries)
+        return sketch_bytes + len(self._entries) * (self._bands + 1) * 36 + len(self._exact) * 100
+
+    def stats(self) -> dict:
+        return {"removed_docs": self.removed_docs, "removed_tokens": self.removed_tokens}
+
+
+if __name__ == "__main__":
+    pass
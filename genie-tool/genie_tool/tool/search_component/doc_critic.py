@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import asyncio
+import hashlib
+import os
+from typing import List
+
+from loguru import logger
+
+from genie_tool.model.document import Doc
+from genie_tool.util.cache_util import TTLCache, normalize_query
+from genie_tool.util.llm_util import ask_llm
+from genie_tool.util.log_util import timer
+from genie_tool.util.prompt_util import get_prompt
+from genie_tool.util.token_util import truncate_tokens
+from genie_tool.util.url_util import canonicalize_url
+
+
+# 文档相关性判定缓存：key 为 模型 + 归一化 query + 归一化 URL，value 为是否相关
+DocCriticCache = TTLCache(
+    name="doc_critic",
+    ttl=int(os.getenv("DOC_CRITIC_CACHE_TTL", 86400)),
+    max_size=int(os.getenv("DOC_CRITIC_CACHE_MAX_SIZE", 20000)),
+    disk_path=os.getenv("DOC_CRITIC_CACHE_DISK_PATH") or None,
+)
+
+_CRITIC_SEMAPHORE = asyncio.Semaphore(int(os.getenv("DOC_CRITIC_CONCURRENCY", 10)))
+
+
+@timer()
+async def doc_critic(query: str, docs: List[Doc], request_id: str = None) -> List[Doc]:
+    """用小模型并发判断文档与 query 是否相关，过滤掉不相关的文档；判定失败的文档保留"""
+    if not docs:
+        return docs
+    model = os.getenv("DOC_CRITIC_MODEL", "gpt-4.1-mini")
+    verdicts = await asyncio.gather(*[_is_relevant(query, doc, model, request_id) for doc in docs])
+    relevant_docs = [doc for doc, relevant in zip(docs, verdicts) if relevant]
+    logger.info(f"{request_id} doc critic: {len(docs)} -> {len(relevant_docs)} docs, cache={DocCriticCache.stats()}")
+    return relevant_docs
+
+
+async def _is_relevant(query: str, doc: Doc, model: str, request_id: str) -> bool:
+    doc_key = canonicalize_url(doc.link) or hashlib.md5(doc.content.encode("utf-8")).hexdigest()
+    key = f"{model}:{normalize_query(query)}:{doc_key}"
+    if (cached := await DocCriticCache.get(key)) is not None:
+        return cached
+
+    prompt = get_prompt("deepsearch")["doc_critic_template"].format(
+        user_info="",
+        doc_content=truncate_tokens(doc.content, int(os.getenv("DOC_CRITIC_MAX_TOKENS", 2000)), model),
+        question=query,
+    )
+    try:
+        async with _CRITIC_SEMAPHORE:
+            output = ""
+            async for chunk in ask_llm(messages=prompt, model=model, stream=False, only_content=True, max_tokens=4):
+                output += chunk or ""
+    except Exception as e:
+        logger.warning(f"{request_id} doc critic error: url=[{doc.link}] error={e}")
+        return True
+    # 不确定时视为相关
+    relevant = not output.strip().startswith("0")
+    await DocCriticCache.set(key, relevant)
+    return relevant
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from genie_tool.model.document import Doc
+from genie_tool.util.rate_limit_util import RateLimiter
+
+
+class LatencyTracker(object):
+    """单个引擎最近 window 次成功请求的耗时"""
+
+    def __init__(self, window: int):
+        self._latencies = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def record(self, latency: float):
+        self._latencies.append(latency)
+
+    def percentile(self, q: float, min_samples: int) -> Optional[float]:
+        if len(self._latencies) < min_samples:
+            return None
+        return float(np.percentile(self._latencies, q))
+
+
+class CircuitBreaker(object):
+    """连续失败 max_failures 次后熔断 cooldown 秒；冷却结束后放行一个探测请求，成功则恢复，失败继续熔断"""
+
+    def __init__(self, max_failures: int, cooldown: float):
+        self._max_failures = max_failures
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def probing(self) -> bool:
+        """当前放行的请求是冷却结束后的探测请求"""
+        return self._probing
+
+    def allow(self) -> bool:
+        if self._failures < self._max_failures:
+            return True
+        if time.monotonic() < self._open_until or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def success(self):
+        self._failures = 0
+        self._probing = False
+
+    def release(self):
+        """请求被取消，既不算成功也不算失败"""
+        self._probing = False
+
+    def failure(self):
+        self._failures += 1
+        self._probing = False
+        if self._failures >= self._max_failures:
+            self._open_until = time.monotonic() + self._cooldown
+
+
+class _HedgeSkipped(Exception):
+    """没有立即可用的限流额度，未发出对冲请求"""
+
+
+class _EngineGuard(object):
+    """搜索引擎调用保护：按引擎统计耗时并自适应超时、对慢请求发起对冲请求、熔断持续失败的引擎
+
+    - 超时：样本足够时取 p95 * SEARCH_TIMEOUT_FACTOR，限制在 [SEARCH_TIMEOUT_MIN, SEARCH_TIMEOUT] 内；超时的请求按触发的
+      超时时间记为（截尾）样本，熔断后的探测请求和每 SEARCH_TIMEOUT_EXPLORE_EVERY 个请求使用 SEARCH_TIMEOUT，
+      引擎整体变慢后超时可以重新增长，而不是一直失败
+    - 对冲：SEARCH_HEDGE_ENABLE=true 时，请求耗时超过 SEARCH_HEDGE_PERCENTILE 分位仍未返回则再发一次，取先返回的结果
+    - 熔断：连续失败 SEARCH_BREAKER_FAILURES 次后 SEARCH_BREAKER_COOLDOWN 秒内直接跳过该引擎
+    失败、超时、熔断均返回空列表，由调用方使用其他引擎的部分结果。
+    传入 limiter 时每次请求（包括对冲请求）都占用一份限流额度：首次请求排队等待（不计入超时），
+    对冲请求在没有立即可用的额度时跳过，避免对冲使实际 QPS 超过配置。
+    """
+
+    def __init__(self):
+        self._adaptive = os.getenv("SEARCH_ADAPTIVE_TIMEOUT", "true") == "true"
+        self._max_timeout = float(os.getenv("SEARCH_TIMEOUT", 10))
+        self._min_timeout = float(os.getenv("SEARCH_TIMEOUT_MIN", 2))
+        self._timeout_factor = float(os.getenv("SEARCH_TIMEOUT_FACTOR", 1.5))
+        self._window = int(os.getenv("SEARCH_LATENCY_WINDOW", 200))
+        self._min_samples = int(os.getenv("SEARCH_LATENCY_MIN_SAMPLES", 20))
+        self._hedge = os.getenv("SEARCH_HEDGE_ENABLE", "false") == "true"
+        self._hedge_percentile = float(os.getenv("SEARCH_HEDGE_PERCENTILE", 90))
+        self._max_failures = int(os.getenv("SEARCH_BREAKER_FAILURES", 5))
+        self._cooldown = float(os.getenv("SEARCH_BREAKER_COOLDOWN", 30))
+        self._explore_every = int(os.getenv("SEARCH_TIMEOUT_EXPLORE_EVERY", 20))
+        self._calls: Dict[str, int] = {}
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _tracker(self, engine: str) -> LatencyTracker:
+        if engine not in self._trackers:
+            self._trackers[engine] = LatencyTracker(self._window)
+        return self._trackers[engine]
+
+    def _breaker(self, engine: str) -> CircuitBreaker:
+        if engine not in self._breakers:
+            self._breakers[engine] = CircuitBreaker(self._max_failures, self._cooldown)
+        return self._breakers[engine]
+
+    def timeout(self, engine: str) -> float:
+        if self._adaptive and (p95 := self._tracker(engine).percentile(95, self._min_samples)) is not None:
+            return min(max(p95 * self._timeout_factor, self._min_timeout), self._max_timeout)
+        return self._max_timeout
+
+    async def call(
+            self,
+            engine: str,
+            search: Callable[[], Awaitable[List[Doc]]],
+            request_id: str = None,
+            limiter: Optional[RateLimiter] = None,
+    ) -> List[Doc]:
+        breaker = self._breaker(engine)
+        if not breaker.allow():
+            logger.warning(f"{request_id} search engine [{engine}] circuit open, skipped")
+            return []
+        self._calls[engine] = self._calls.get(engine, 0) + 1
+        explore = breaker.probing or (self._explore_every > 0 and self._calls[engine] % self._explore_every == 0)
+        timeout = self._max_timeout if explore else self.timeout(engine)
+        start = time.monotonic()
+        try:
+            async with limiter.acquire() if limiter else nullcontext():
+                # 排队等待限流额度的时间不计入超时
+                start = time.monotonic()
+                async with asyncio.timeout(timeout):
+                    docs = await self._hedged(engine, search, limiter, request_id)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.failure()
+            if isinstance(e, TimeoutError) and (latency := time.monotonic() - start) >= timeout:
+                # 截尾样本：真实耗时至少为 timeout
+                self._tracker(engine).record(latency)
+            logger.warning(f"{request_id} search engine [{engine}] failed after "
+                           f"{int((time.monotonic() - start) * 1000)} ms (timeout={timeout:.1f}s): {e!r}")
+            return []
+        breaker.success()
+        self._tracker(engine).record(time.monotonic() - start)
+        return docs
+
+    async def _hedged(
+            self,
+            engine: str,
+            search: Callable[[], Awaitable[List[Doc]]],
+            limiter: Optional[RateLimiter],
+            request_id: str,
+    ) -> List[Doc]:
+        hedge_delay = self._tracker(engine).percentile(self._hedge_percentile, self._min_samples) \
+            if self._hedge else None
+        if hedge_delay is None:
+            return await search()
+
+        async def _hedge() -> List[Doc]:
+            async with limiter.try_acquire() if limiter else nullcontext(True) as acquired:
+                if not acquired:
+                    logger.info(f"{request_id} search engine [{engine}] hedge skipped: rate limited")
+                    raise _HedgeSkipped()
+                return await search()
+
+        tasks = [asyncio.create_task(search())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                logger.info(f"{request_id} search engine [{engine}] hedged after {int(hedge_delay * 1000)} ms")
+                tasks.append(asyncio.create_task(_hedge()))
+            # 取第一个成功的结果，全部失败时抛出首次请求的异常
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    raise tasks[0].exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            engine: {"timeout": round(self.timeout(engine), 2), "samples": len(tracker)}
+            for engine, tracker in self._trackers.items()
+        }
+
+
+EngineGuard = _EngineGuard()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import asyncio
+import multiprocessing
+import os
+import re
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import lxml.html
+from bs4 import BeautifulSoup
+from loguru import logger
+
+
+_BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "nav", "footer", "header", "aside", "iframe", "svg",
+    "button", "select", "textarea", "object", "embed", "canvas", "link", "meta",
+]
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr", "pre", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6", "br", "dd", "dt", "dl", "figcaption",
+}
+_BOILERPLATE_PATTERN = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|header|sidebar|breadcrumbs?|comments?|share|social|advert|ads?|banner|"
+    r"related|recommend|copyright|login|popup|modal|cookie|subscribe|toolbar|pagination)([\s_-]|$)", re.I)
+_CONTENT_HINT_PATTERN = re.compile(r"article|content|main|post|entry|body|text", re.I)
+_MAIN_CONTENT_XPATH = "//article | //main | //*[@role='main'] | //*[@itemprop='articleBody']"
+_MIN_MAIN_TEXT = 200
+
+
+def extract_text_bs4(html: str) -> str:
+    """从 html 中抽取纯文本（BeautifulSoup 全文）"""
+    if not html:
+        return ""
+    soup = BeautifulSoup(html, "html.parser")
+    text = soup.get_text()
+    return text if text and len(text.strip()) > 50 else str(soup.text)
+
+
+def _node_text(node) -> str:
+    lines = (re.sub(r"[ \t\u3000]+", " ", line).strip() for line in node.text_content().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _link_density(node, text_len: int) -> float:
+    link_len = sum(len(a.text_content()) for a in node.iter("a"))
+    return link_len / text_len if text_len else 1.0
+
+
+def _best_candidate(body):
+    """readability 风格打分：段落为父节点 / 祖父节点加分，并按链接密度降权"""
+    scores = {}
+    for p in body.iter("p", "pre", "td", "blockquote"):
+        text = p.text_content().strip()
+        if len(text) < 25:
+            continue
+        score = 1 + text.count("，") + text.count(",") + min(len(text) // 100, 3)
+        parent = p.getparent()
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + score
+            grand = parent.getparent()
+            if grand is not None:
+                scores[grand] = scores.get(grand, 0) + score / 2
+    best, best_score = None, 0
+    for node, score in scores.items():
+        score *= 1 - _link_density(node, len(node.text_content()))
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def extract_text_readability(html: str) -> str:
+    """基于 lxml（C 实现）的正文抽取：去除导航、页脚、脚本等模板内容后选取正文区域"""
+    if not html:
+        return ""
+    try:
+        # lxml 不接受带 encoding 声明的 str
+        html = re.sub(r"^\s*<\?xml[^>]*\?>", "", html)
+        tree = lxml.html.document_fromstring(html)
+    except Exception:
+        return extract_text_bs4(html)
+    for node in tree.xpath("//comment() | //processing-instruction()"):
+        if node.getparent() is not None:
+            node.drop_tree()
+    for node in list(tree.iter(*_BOILERPLATE_TAGS)):
+        node.drop_tree()
+    # 搜索框、登录框等小表单直接去掉；ASP.NET WebForms 等页面用 <form> 包裹整个 body，不能整体删除
+    for node in list(tree.iter("form")):
+        if len(node.text_content().strip()) < _MIN_MAIN_TEXT:
+            node.drop_tree()
+    for node in tree.xpath("//*[@class or @id]"):
+        if node.tag in ("html", "body", "article", "main"):
+            continue
+        attrs = f"{node.get('class', '')} {node.get('id', '')}"
+        if _BOILERPLATE_PATTERN.search(attrs) and not _CONTENT_HINT_PATTERN.search(attrs):
+            node.drop_tree()
+    for node in tree.iter(*_BLOCK_TAGS):
+        node.tail = "\n" + (node.tail or "")
+    for node in tree.iter("td", "th"):
+        node.tail = "\t" + (node.tail or "")
+
+    body = tree.find("body") if tree.find("body") is not None else tree
+    mains = [node for node in tree.xpath(_MAIN_CONTENT_XPATH) if len(node.text_content().strip()) >= _MIN_MAIN_TEXT]
+    main = mains[0] if mains else _best_candidate(body)
+    if main is not None:
+        text = _node_text(main)
+        if len(text) >= _MIN_MAIN_TEXT:
+            return text
+    text = _node_text(body)
+    return text if len(text) > 50 else extract_text_bs4(html)
+
+
+_EXTRACTORS = {
+    "bs4": extract_text_bs4,
+    "readability": extract_text_readability,
+}
+
+
+def extract_text(html: str) -> str:
+    """从 html 中抽取正文，抽取方式由 PAGE_EXTRACTOR 指定（readability / bs4）"""
+    return _EXTRACTORS.get(os.getenv("PAGE_EXTRACTOR", "readability"), extract_text_readability)(html)
+
+
+class _ExtractTimeout(Exception):
+    pass
+
+
+def _raise_extract_timeout(signum, frame):
+    raise _ExtractTimeout()
+
+
+def extract_text_with_deadline(html: str, timeout: float) -> Optional[str]:
+    """在进程池 worker 中执行：超过 timeout 秒时中断解析并返回 None，释放 worker 给后续页面"""
+    if timeout <= 0 or not hasattr(signal, "setitimer"):
+        return extract_text(html)
+    handler = signal.signal(signal.SIGALRM, _raise_extract_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return extract_text(html)
+    except _ExtractTimeout:
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, handler)
+
+
+class _HtmlExtractPool(object):
+    """html 正文抽取进程池
+
+    html 解析是纯 CPU 操作，放在事件循环线程上会阻塞同一 worker 上的所有请求。这里把解析交给独立进程，
+    主进程只接收抽取后的文本。进程数为 0 时退化为在事件循环上直接解析。
+    提交的任务数不超过进程数，排队等待的时间不计入超时；超时由 worker 内的定时器中断解析，而不只是停止等待。
+    """
+
+    def __init__(self):
+        self._process_num = int(os.getenv("PAGE_PARSER_PROCESS_NUM", 2))
+        self._max_html_size = int(os.getenv("PAGE_PARSER_MAX_HTML_SIZE", 2 * 1024 * 1024))
+        self._timeout = float(os.getenv("PAGE_PARSER_TIMEOUT", 5))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(max(self._process_num, 1))
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 不直接 fork 带有线程的 worker 进程：forkserver 预先只导入本模块（lxml / bs4），子进程从它 fork 出来，
+            # 不会带上服务进程里已导入的 litellm、pandas 等；不支持 forkserver 的平台退化为 spawn
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self._process_num, mp_context=context)
+        return self._executor
+
+    async def extract(self, html: str, url: str = "") -> str:
+        if not html:
+            return ""
+        html = html[: self._max_html_size]
+        if self._process_num <= 0:
+            return extract_text(html)
+        async with self._semaphore:
+            try:
+                # worker 内定时器未能及时中断时（如长时间停留在 C 扩展中）兜底停止等待
+                text = await asyncio.wait_for(
+                    asyncio.get_running_loop().run_in_executor(
+                        self.executor, extract_text_with_deadline, html, self._timeout),
+                    timeout=self._timeout + 1)
+            except asyncio.TimeoutError:
+                text = None
+            except BrokenProcessPool:
+                logger.warning(f"html extract pool broken, recreate: url=[{url}]")
+                self.shutdown()
+                return ""
+        if text is None:
+            logger.warning(f"html extract timeout: url=[{url}] size=[{len(html)}]")
+            return ""
+        return text
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+HtmlExtractPool = _HtmlExtractPool()
+
+
+async def shutdown_html_extract_pool():
+    HtmlExtractPool.shutdown()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import codecs
+import os
+import re
+from typing import Optional
+
+from aiohttp import ClientResponse
+from loguru import logger
+
+from genie_tool.tool.search_component.html_extractor import HtmlExtractPool
+from genie_tool.util.cache_util import TTLCache
+from genie_tool.util.http_util import HttpClient
+from genie_tool.util.url_util import canonicalize_url
+
+
+PARSE_CONTENT_TYPES = [
+    "text/html", "text/plain", "text/xml", "application/json", "application/xml", "application/octet-stream"]
+
+# 单页下载字节上限：默认随 SINGLE_PAGE_MAX_SIZE（字符数）按 html / 正文比例放大，且不低于 1MB
+MAX_PAGE_BYTES = int(os.getenv("PAGE_FETCH_MAX_BYTES", 0)) or max(
+    int(os.getenv("SINGLE_PAGE_MAX_SIZE", 0)) * 32, 1024 * 1024)
+_READ_CHUNK_SIZE = 64 * 1024
+_BINARY_MAGICS = (
+    b"%PDF", b"PK\x03\x04", b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"\x1f\x8b", b"Rar!", b"\x7fELF",
+    b"\xd0\xcf\x11\xe0", b"ID3",
+)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+_META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_-]+)""", re.I)
+
+
+# 网页正文缓存：key 为归一化后的 URL，value 为抽取后的正文及 ETag / Last-Modified
+PageCache = TTLCache(
+    name="page",
+    ttl=int(os.getenv("PAGE_CACHE_TTL", 3600)),
+    stale_ttl=int(os.getenv("PAGE_CACHE_STALE_TTL", 86400)),
+    max_size=int(os.getenv("PAGE_CACHE_MAX_SIZE", 5000)),
+    max_bytes=int(os.getenv("PAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    disk_path=os.getenv("PAGE_CACHE_DISK_PATH") or None,
+    disk_max_size=int(os.getenv("PAGE_CACHE_DISK_MAX_SIZE", 200000)),
+    disk_max_bytes=int(os.getenv("PAGE_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024)),
+    sizeof=lambda v: len(v.get("text", "").encode("utf-8")),
+    enable=os.getenv("PAGE_CACHE_ENABLE", "true") == "true",
+)
+
+
+async def fetch_page_text(url: str, timeout: int = 10) -> str:
+    """抓取网页并返回抽取后的正文
+
+    命中未过期缓存直接返回；缓存已过期但带有 ETag / Last-Modified 时发起条件请求，304 则续期复用；
+    抓取失败时退回使用过期缓存。
+    """
+    if not url:
+        return ""
+    key = canonicalize_url(url)
+    entry = await PageCache.get_entry(key)
+    if entry and entry[1]:
+        return entry[0]["text"]
+
+    headers = {}
+    if entry:
+        if entry[0].get("etag"):
+            headers["If-None-Match"] = entry[0]["etag"]
+        if entry[0].get("last_modified"):
+            headers["If-Modified-Since"] = entry[0]["last_modified"]
+    try:
+        async with HttpClient.session.get(url, timeout=timeout, headers=headers or None) as response:
+            if response.status == 304 and entry:
+                await PageCache.set(key, entry[0])
+                return entry[0]["text"]
+            if response.content_type.lower() not in PARSE_CONTENT_TYPES:
+                # TODO 其他类型暂时不解析
+                logger.warning(f"parser content-type[{response.content_type}] not parser: url=[{url}]")
+                return ""
+            body = await _read_body(response, url)
+            if body is None:
+                return ""
+            html = _decode(body, response.charset)
+            etag = response.headers.get("ETag", "")
+            last_modified = response.headers.get("Last-Modified", "")
+    except Exception as e:
+        logger.warning(f"parser error: url=[{url}] error={e}")
+        return entry[0]["text"] if entry else ""
+
+    text = await HtmlExtractPool.extract(html, url=url)
+    if text:
+        await PageCache.set(key, {"text": text, "etag": etag, "last_modified": last_modified})
+    return text
+
+
+async def _read_body(response: ClientResponse, url: str) -> Optional[bytes]:
+    """流式读取响应体：超过 MAX_PAGE_BYTES 截断，声明长度超限或二进制内容直接放弃"""
+    if response.content_length and response.content_length > MAX_PAGE_BYTES:
+        logger.warning(f"parser skip oversized page: url=[{url}] content-length=[{response.content_length}]")
+        return None
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(_READ_CHUNK_SIZE):
+        if not chunks and _is_binary(chunk):
+            logger.warning(f"parser skip binary page: url=[{url}]")
+            return None
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_PAGE_BYTES:
+            logger.warning(f"parser truncate page: url=[{url}] max_bytes=[{MAX_PAGE_BYTES}]")
+            break
+    return b"".join(chunks)[:MAX_PAGE_BYTES]
+
+
+def _is_binary(head: bytes) -> bool:
+    if any(head.startswith(bom) for bom, _ in _BOMS):
+        return False
+    return head.startswith(_BINARY_MAGICS) or b"\x00" in head[:1024]
+
+
+def _detect_charset(body: bytes, header_charset: Optional[str]) -> Optional[str]:
+    """依次从 BOM、响应头、html meta 中确定编码"""
+    for bom, charset in _BOMS:
+        if body.startswith(bom):
+            return charset
+    if header_charset:
+        return header_charset
+    if match := _META_CHARSET_PATTERN.search(body[:4096]):
+        return match.group(1).decode("ascii")
+    return None
+
+
+def _decode(body: bytes, header_charset: Optional[str]) -> str:
+    charset = _detect_charset(body, header_charset)
+    if charset:
+        try:
+            # 截断位置可能落在多字节字符中间，使用增量解码忽略末尾不完整的字符
+            return codecs.getincrementaldecoder(charset)(errors="strict").decode(body, final=False)
+        except (LookupError, UnicodeDecodeError):
+            pass
+    try:
+        return codecs.getincrementaldecoder("utf-8")(errors="strict").decode(body, final=False)
+    except UnicodeDecodeError:
+        return body.decode("gb18030", errors="ignore")
+
+
+if __name__ == "__main__":
+    pass
@@ -5,9 +5,11 @@
 # Author: liumin.423
 # Date:   2025/7/9
 # =====================
+import hashlib
 import os
 import re
 import time
+from typing import AsyncGenerator, List
 
 from loguru import logger
 
@@ -15,6 +17,20 @@ from genie_tool.util.llm_util import ask_llm
 from genie_tool.util.prompt_util import get_prompt
 from genie_tool.model.context import RequestIdCtx
 from genie_tool.util.log_util import timer
+from genie_tool.util.cache_util import TTLCache, normalize_query
+
+
+# 合并 think + decompose 时，思考内容与查询列表之间的分隔行
+COMBINED_QUERY_MARKER = "## 搜索查询"
+
+# 查询分解结果缓存：key 包含归一化 query、模型、最大子查询数和当前日期（prompt 中带有 current_date）
+QueryDecomposeCache = TTLCache(
+    name="query_decompose",
+    ttl=int(os.getenv("QUERY_DECOMPOSE_CACHE_TTL", 3600)),
+    max_size=int(os.getenv("QUERY_DECOMPOSE_CACHE_MAX_SIZE", 2000)),
+    disk_path=os.getenv("QUERY_DECOMPOSE_CACHE_DISK_PATH") or None,
+    enable=os.getenv("QUERY_DECOMPOSE_CACHE_ENABLE", "true") == "true",
+)
 
 
 @timer()
@@ -22,46 +38,137 @@ async def query_decompose(
         query: str,
         **kwargs
 ):
+    return [sub_query async for sub_query in query_decompose_stream(query=query, **kwargs)]
+
+
+async def query_decompose_stream(
+        query: str,
+        combined: bool = None,
+        retrieval_str: str = "",
+        use_cache: bool = True,
+        **kwargs
+) -> AsyncGenerator[str, None]:
+    """流式查询分解：decompose 输出中每解析出一行子查询就立即返回
+
+    combined 为 True 时将 think 与 decompose 合并为一次流式调用，省去一次串行的 LLM 往返。
+    retrieval_str 为已检索内容的描述，多轮搜索时用于只针对缺失的信息生成查询。
+    use_cache 为 False 时不读写分解缓存（多轮搜索的后续轮次需要重新分解）。
+    """
+    if combined is None:
+        combined = os.getenv("QUERY_DECOMPOSE_COMBINED", "false") == "true"
     model = os.getenv("QUERY_DECOMPOSE_MODEL", "gpt-4.1")
     think_model = os.getenv("QUERY_DECOMPOSE_THINK_MODEL", "gpt-4.1")
     current_date = time.strftime("%Y-%m-%d", time.localtime())
+    max_queries = os.getenv("QUERY_DECOMPOSE_MAX_SIZE", 5)
+
+    cache_key = ":".join([
+        normalize_query(query), model, "" if combined else think_model, str(max_queries), current_date,
+        hashlib.md5(retrieval_str.encode("utf-8")).hexdigest(),
+    ])
+    if use_cache and (cached := await QueryDecomposeCache.get(cache_key)) is not None:
+        logger.info(f"{RequestIdCtx.request_id} query_decompose cache hit: {cached}")
+        for sub_query in cached:
+            yield sub_query
+        return
+
+    sub_queries = []
+    async for sub_query in _query_decompose_stream(
+            query, combined, retrieval_str, model, think_model, current_date, max_queries):
+        sub_queries.append(sub_query)
+        yield sub_query
+    # 只缓存完整生成的结果，调用方提前结束时不写入
+    if use_cache and sub_queries:
+        await QueryDecomposeCache.set(cache_key, sub_queries)
+
+
+async def _query_decompose_stream(
+        query: str,
+        combined: bool,
+        retrieval_str: str,
+        model: str,
+        think_model: str,
+        current_date: str,
+        max_queries,
+) -> AsyncGenerator[str, None]:
     decompose_prompt = get_prompt("deepsearch")
-    # think
-    think_content = ""
-    async for chunk in ask_llm(
-            messages=decompose_prompt["query_decompose_think_prompt"].format(task=query, retrieval_str=""),
-            model=think_model,
-            stream=True,
-            only_content=True,  # 只返回内容
-    ):
-        if chunk:
-            think_content += chunk
-
-    logger.info(f"{RequestIdCtx.request_id} query_decompose think: {think_content}")
-
-    # decompose
-    messages = [
-        {
-            "role": "system",
-            "content": decompose_prompt["query_decompose_prompt"].format(
-                current_date=current_date, max_queries=os.getenv("QUERY_DECOMPOSE_MAX_SIZE", 5))},
-        {"role": "user", "content": f"思考结果：{think_content}"},
-    ]
+
+    if combined:
+        messages = decompose_prompt["query_decompose_combined_prompt"].format(
+            task=query, current_date=current_date, max_queries=max_queries, marker=COMBINED_QUERY_MARKER,
+            retrieval_str=retrieval_str)
+    else:
+        # think
+        think_content = ""
+        async for chunk in ask_llm(
+                messages=decompose_prompt["query_decompose_think_prompt"].format(task=query, retrieval_str=retrieval_str),
+                model=think_model,
+                stream=True,
+                only_content=True,  # 只返回内容
+        ):
+            if chunk:
+                think_content += chunk
+
+        logger.info(f"{RequestIdCtx.request_id} query_decompose think: {think_content}")
+
+        # decompose
+        messages = [
+            {
+                "role": "system",
+                "content": decompose_prompt["query_decompose_prompt"].format(
+                    current_date=current_date, max_queries=max_queries)},
+            {"role": "user", "content": f"思考结果：{think_content}"},
+        ]
+
     extend_queries = ""
+    buffer = ""
+    # 合并模式下只解析分隔行之后的内容
+    started = not combined
     async for chunk in ask_llm(
             messages=messages,
             model=model,
             stream=True,
             only_content=True,  # 只返回内容
     ):
-        if chunk:
-            extend_queries += chunk
+        if not chunk:
+            continue
+        extend_queries += chunk
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if not started:
+                started = line.strip().startswith(COMBINED_QUERY_MARKER)
+            elif sub_query := _parse_query_line(line):
+                yield sub_query
+    if started and (sub_query := _parse_query_line(buffer)):
+        yield sub_query
+    elif not started:
+        # 合并模式下模型没有输出分隔行，退化为解析全部列表行
+        for line in extend_queries.split("\n"):
+            if sub_query := _parse_query_line(line):
+                yield sub_query
 
     logger.info(f"{RequestIdCtx.request_id} query_decompose queries: {extend_queries}")
 
-    # 解析
-    queries = re.findall(r"^- (.+)$", extend_queries, re.MULTILINE)
-    return [match.strip() for match in queries]
+
+def is_similar_query(query: str, history: List[str], threshold: float = None) -> bool:
+    """归一化后字符 bigram 的 Jaccard 相似度不低于 threshold 即视为重复查询"""
+    threshold = float(os.getenv("QUERY_DEDUP_THRESHOLD", 0.8)) if threshold is None else threshold
+    grams = _query_grams(query)
+    for history_query in history:
+        history_grams = _query_grams(history_query)
+        if len(grams & history_grams) >= threshold * len(grams | history_grams):
+            return True
+    return False
+
+
+def _query_grams(query: str) -> set:
+    text = re.sub(r"[\W_]+", "", normalize_query(query))
+    return {text[i: i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _parse_query_line(line: str) -> str:
+    match = re.match(r"^- (.+)$", line.rstrip("\r"))
+    return match.group(1).strip() if match else ""
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import os
+import re
+from collections import Counter
+from dataclasses import replace
+from typing import List, Dict
+
+import numpy as np
+
+from genie_tool.model.document import Doc
+from genie_tool.util.token_util import count_tokens
+
+
+_LATIN_PATTERN = re.compile(r"[a-z0-9]+")
+_CJK_PATTERN = re.compile(r"[一-鿿㐀-䶿豈-﫿]+")
+_CHUNK_SEPARATOR = "\n...\n"
+
+
+def tokenize(text: str) -> List[str]:
+    """检索用切词：英文 / 数字按词，中文按字 bigram（单字片段保留单字），无需分词器"""
+    text = text.lower()
+    tokens = _LATIN_PATTERN.findall(text)
+    for span in _CJK_PATTERN.findall(text):
+        if len(span) == 1:
+            tokens.append(span)
+        else:
+            tokens.extend(span[i: i + 2] for i in range(len(span) - 1))
+    return tokens
+
+
+def split_passages(doc: Doc, passage_size: int = None, overlap: int = None) -> List[Doc]:
+    """按段落把文档切成不超过 passage_size 字符的 chunk，超长段落按固定窗口切分并保留 overlap 重叠"""
+    passage_size = int(os.getenv("DEEPSEARCH_PASSAGE_SIZE", 600)) if passage_size is None else passage_size
+    overlap = int(os.getenv("DEEPSEARCH_PASSAGE_OVERLAP", 100)) if overlap is None else overlap
+    overlap = min(overlap, passage_size // 2)
+
+    pieces = []
+    for paragraph in doc.content.split("\n"):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= passage_size:
+            if paragraph:
+                pieces.append(paragraph)
+            continue
+        for start in range(0, len(paragraph) - overlap, passage_size - overlap):
+            pieces.append(paragraph[start: start + passage_size])
+
+    passages, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > passage_size:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return [replace(doc, content=passage, is_chunk=True, chunk_id=i) for i, passage in enumerate(passages)]
+
+
+def bm25_scores(passages: List[str], queries: List[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """计算每个 passage 对每个 query 的 BM25 得分，返回 [len(passages), len(queries)] 矩阵
+
+    只对 query 中出现的词建 tf 矩阵，整体按矩阵运算完成。
+    """
+    query_tokens = [Counter(tokenize(q)) for q in queries]
+    vocab = {term: i for i, term in enumerate({t for qt in query_tokens for t in qt})}
+    if not passages or not vocab:
+        return np.zeros((len(passages), len(queries)), dtype=np.float32)
+
+    tf = np.zeros((len(passages), len(vocab)), dtype=np.float32)
+    lengths = np.zeros(len(passages), dtype=np.float32)
+    for i, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths[i] = len(tokens)
+        for term, count in Counter(tokens).items():
+            if (j := vocab.get(term)) is not None:
+                tf[i, j] = count
+    query_matrix = np.zeros((len(queries), len(vocab)), dtype=np.float32)
+    for i, qt in enumerate(query_tokens):
+        for term, count in qt.items():
+            query_matrix[i, vocab[term]] = count
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+    weights = idf * tf * (k1 + 1) / (tf + norm[:, None])
+    return weights @ query_matrix.T
+
+
+def rank_and_pack(
+        docs: List[Doc],
+        query: str,
+        sub_queries: List[str],
+        max_tokens: int,
+        model: str = None,
+        quota: float = None,
+) -> List[Doc]:
+    """把文档切成 passage，按与原始 query 及所属子查询的 BM25 相关性打包进 max_tokens 预算（按 model 的 tokenizer 计数）
+
+    预算的 quota 比例按子查询均分，各子查询先在自己的份额内取得分最高的 passage，保证后面子查询的结果不会被挤掉；
+    剩余预算按全局得分填充。选中的 passage 按原文档合并、保持文档和 chunk 的原始顺序。
+    """
+    quota = float(os.getenv("DEEPSEARCH_RANK_SUBQUERY_QUOTA", 0.5)) if quota is None else quota
+    passages = [passage for doc in docs for passage in split_passages(doc)]
+    if not passages:
+        return []
+
+    query_index = {q: i for i, q in enumerate([query] + [q for q in sub_queries if q != query])}
+    scores_matrix = bm25_scores([p.content for p in passages], list(query_index))
+    groups: Dict[int, List[int]] = {}
+    scores = np.empty(len(passages), dtype=np.float32)
+    for i, passage in enumerate(passages):
+        sub_query_index = query_index.get(passage.data.get("query"), 0)
+        scores[i] = scores_matrix[i, 0] + (scores_matrix[i, sub_query_index] if sub_query_index else 0)
+        groups.setdefault(sub_query_index, []).append(i)
+
+    lengths = [count_tokens(p.content, model) for p in passages]
+    selected, size = set(), 0
+
+    def _take(i: int, limit: int) -> bool:
+        nonlocal size
+        length = lengths[i]
+        if size + length > limit:
+            return False
+        selected.add(i)
+        size += length
+        return True
+
+    # 各子查询在自己的份额内取 passage
+    group_budget = int(max_tokens * quota / len(groups))
+    for group in groups.values():
+        group_size = 0
+        for i in sorted(group, key=lambda j: -scores[j]):
+            if group_size + lengths[i] > group_budget:
+                continue
+            if _take(i, max_tokens):
+                group_size += lengths[i]
+    # 剩余预算按全局得分填充
+    for i in np.argsort(-scores, kind="stable").tolist():
+        if i not in selected:
+            _take(i, max_tokens)
+
+    # 按原文档合并
+    merged: Dict[str, Doc] = {}
+    for i in sorted(selected):
+        passage = passages[i]
+        if passage.unique_id in merged:
+            doc = merged[passage.unique_id]
+            doc.content = f"{doc.content}{_CHUNK_SEPARATOR}{passage.content}"
+        else:
+            merged[passage.unique_id] = replace(passage)
+    return list(merged.values())
+
+
+if __name__ == "__main__":
+    pass
@@ -7,47 +7,92 @@
 # =====================
 import json
 import os
+import re
 import time
+from contextlib import aclosing
+from typing import Optional
+
 from json_repair import repair_json
+from loguru import logger
 
 from genie_tool.util.llm_util import ask_llm
 from genie_tool.util.prompt_util import get_prompt
 from genie_tool.util.log_util import timer
 
 
+_IS_ANSWER_PATTERN = re.compile(r'"is_answer"\s*:\s*"?([01])\b')
+_REWRITE_QUERY_PATTERN = re.compile(r'"rewrite_query"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
 @timer()
 async def search_reasoning(
-        request_id: str, query: str, content: str, history_query_list: list = [],
+        request_id: str, query: str, content: str, history_query_list: list = [], summary: Optional[str] = None,
+        need_reason: bool = False,
 ):
+    """推理评估是否需要继续搜索
+
+    summary 不为 None 时使用增量模式：content 只包含本轮新增的文档，由模型把新信息合并进 summary 并返回新的 summary。
+    need_reason 为 True 时调用方需要 reason（排在 rewrite_query 之后），需要继续搜索时不提前结束。
+    """
     if not request_id or not query or not content:
         return {}
 
     model = os.getenv("SEARCH_REASONING_MODEL", "gpt-4.1")
-    prompt = get_prompt("deepsearch")["reasoning_prompt"]
-    prompt_content = prompt.format(
-        query=query,
-        sub_queries=history_query_list,
-        content=content,
-        date=time.strftime("%Y年%m月%d日 %H时%M分%S秒", time.localtime()),
-    )
+    date = time.strftime("%Y年%m月%d日 %H时%M分%S秒", time.localtime())
+    if summary is None:
+        prompt_content = get_prompt("deepsearch")["reasoning_prompt"].format(
+            query=query,
+            sub_queries=history_query_list,
+            content=content,
+            date=date,
+        )
+    else:
+        prompt_content = get_prompt("deepsearch")["reasoning_incremental_prompt"].format(
+            query=query,
+            sub_queries=history_query_list,
+            summary=summary,
+            content=content,
+            date=date,
+            summary_length=os.getenv("SEARCH_REASONING_SUMMARY_LENGTH", 1000),
+        )
     content = ""
-    async for chunk in ask_llm(
+    early_stop = os.getenv("SEARCH_REASONING_EARLY_STOP", "true") == "true"
+    async with aclosing(ask_llm(
             messages=prompt_content,
             model=model,
             stream=True,
             only_content=True,  # 只返回内容
-    ):
-        if chunk:
-            content += chunk
+    )) as chunks:
+        async for chunk in chunks:
+            if chunk:
+                content += chunk
+            # 增量模式 / 需要 reason 时，需要继续搜索还要用到 summary / reason，只在 is_answer=1 时提前结束
+            if early_stop and (verdict := _early_verdict(content)) \
+                    and ((summary is None and not need_reason) or verdict["is_answer"]):
+                # 判定所需字段已经输出完整，取消剩余生成
+                logger.info(f"{request_id} search_reasoning early stop: {verdict}")
+                return _parser(request_id, verdict)
     content_clean = json.loads(repair_json(content, ensure_ascii=False))
     return _parser(request_id, content_clean)
 
 
+def _early_verdict(content: str) -> Optional[dict]:
+    """流式解析评估结果：is_answer=1 时立即返回；is_answer=0 时等 rewrite_query 输出完整后返回"""
+    if not (match := _IS_ANSWER_PATTERN.search(content)):
+        return None
+    if match.group(1) == "1":
+        return {"is_answer": 1}
+    if rewrite := _REWRITE_QUERY_PATTERN.search(content, match.end()):
+        return {"is_answer": 0, "rewrite_query": json.loads(repair_json(f'"{rewrite.group(1)}"', ensure_ascii=False))}
+    return None
+
+
 def _parser(request_id, reasoning: dict) -> dict:
     reasoning_dict = {
         "request_id": request_id,
         "rewrite_query": reasoning.get("rewrite_query", ""),
         "reason": reasoning.get("reason", ""),
+        "summary": reasoning.get("summary", ""),
     }
     if reasoning.get("is_answer", "") in [1, "1"]:
         reasoning_dict["is_verify"] = "1"
@@ -11,16 +11,36 @@ import os
 from loguru import logger
 from abc import ABC, abstractmethod
 from typing import List
-import aiohttp
-from bs4 import BeautifulSoup
 
 from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.dedup import exact_dedup
+from genie_tool.tool.search_component.engine_guard import EngineGuard
+from genie_tool.tool.search_component.page_fetcher import fetch_page_text
+from genie_tool.util.cache_util import TTLCache, normalize_query
+from genie_tool.util.http_util import HttpClient
 from genie_tool.util.log_util import timer
+from genie_tool.util.rate_limit_util import engine_rate_limiter
+from genie_tool.util.url_util import canonicalize_url
+
+
+# 搜索结果缓存：key 为 引擎 + SEARCH_COUNT + 归一化 query
+SearchCache = TTLCache(
+    name="search",
+    ttl=int(os.getenv("SEARCH_CACHE_TTL", 600)),
+    max_size=int(os.getenv("SEARCH_CACHE_MAX_SIZE", 2000)),
+    disk_path=os.getenv("SEARCH_CACHE_DISK_PATH") or None,
+    disk_max_size=int(os.getenv("SEARCH_CACHE_DISK_MAX_SIZE", 100000)),
+    enable=os.getenv("SEARCH_CACHE_ENABLE", "true") == "true",
+)
 
 
 class SearchBase(ABC):
     """搜索基类"""
 
+    _use_cache = True
+    # 单个引擎的网络请求经过 EngineGuard（自适应超时 / 对冲 / 熔断）
+    _use_guard = True
+
     def __init__(self):
         self._count = int(os.getenv("SEARCH_COUNT", 10))
         self._timeout = int(os.getenv("SEARCH_TIMEOUT", 10))
@@ -31,31 +51,38 @@ class SearchBase(ABC):
         """抽象搜索方法"""
         raise NotImplementedError
 
+    async def cached_search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
+        """带缓存的搜索，仅缓存非空结果"""
+        if not self._use_cache or not SearchCache.enable:
+            return await self.guarded_search(query=query, request_id=request_id, *args, **kwargs)
+        key = f"{self._engine}:{self._count}:{normalize_query(query)}"
+        if (cached := await SearchCache.get(key)) is not None:
+            logger.info(f"{request_id} search cache hit: engine=[{self._engine}] query=[{query}] stats={SearchCache.stats()}")
+            return [Doc(**{**d, "data": dict(d.get("data") or {})}) for d in cached]
+        docs = await self.guarded_search(query=query, request_id=request_id, *args, **kwargs)
+        if docs:
+            # data 会在后续流程中被修改（search_engines / query 等），缓存中保存副本
+            await SearchCache.set(key, [{**d, "data": dict(d["data"] or {})} for d in (doc.to_dict() for doc in docs)])
+        return docs
+
+    async def guarded_search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
+        """失败、超时或熔断时返回空列表"""
+        if not self._use_guard:
+            return await self.search(query=query, request_id=request_id, *args, **kwargs)
+        return await EngineGuard.call(
+            self._engine,
+            lambda: self.search(query=query, request_id=request_id, *args, **kwargs),
+            request_id,
+            limiter=self._rate_limiter,
+        )
+
     @staticmethod
     @timer()
     async def parser(docs: List[Doc], timeout: int=10, **kwargs) -> List[Doc]:
-        async def _parser(source_url, timeout):
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.get(source_url, timeout=timeout) as response:
-                        if response.content_type.lower() in [
-                                "text/html", "text/plain", "text/xml", "application/json", "application/xml", "application/octet-stream"]:
-                            return await response.text()
-                        else:
-                            # TODO 其他类型暂时不解析
-                            logger.warning(f"parser content-type[{response.content_type}] not parser: url=[{source_url}]")
-                            return ""
-                except UnicodeDecodeError as ude:
-                    return ude.args[1].decode("gb2312", errors="ignore")
-                except Exception as e:
-                    logger.warning(f"parser error: url=[{source_url}] error={e}")
-                    return ""
         async with asyncio.TaskGroup() as tg:
-            tasks = [tg.create_task(_parser(doc.link, timeout)) for doc in docs]
-        results = [BeautifulSoup(task.result(), "html.parser") for task in tasks]
-        results = [soup.get_text() if soup.get_text() and len(soup.get_text().strip()) > 50 else str(soup.text) for soup in results]
-        for doc, result in zip(tasks, results):
-            if result:
+            tasks = [tg.create_task(fetch_page_text(doc.link, timeout)) for doc in docs]
+        for doc, task in zip(docs, tasks):
+            if result := task.result():
                 doc.content = result
         return docs
 
@@ -66,16 +93,10 @@ class SearchBase(ABC):
         """
         搜索并去重，同时删除没有内容的文档
         """
-        docs = await self.search(query=query, request_id=request_id, *args, **kwargs)
+        docs = await self.cached_search(query=query, request_id=request_id, *args, **kwargs)
         docs = await self.parser(docs=docs)
-
-        seen_docs = set()
-        deduped_docs = []
-        for doc in docs:
-            if doc.content and doc.content not in seen_docs:
-                deduped_docs.append(doc)
-                seen_docs.add(doc.content)
-        return deduped_docs
+        # 单次搜索内只做精确去重，近似去重由 DeepSearch 的跨子查询索引负责
+        return exact_dedup(docs)
 
 
 class BingSearch(SearchBase):
@@ -83,6 +104,7 @@ class BingSearch(SearchBase):
     def __init__(self):
         super().__init__()
         self._engine = "bing-search"
+        self._rate_limiter = engine_rate_limiter(self._engine, "BING_SEARCH")
         self._url = os.getenv("BING_SEARCH_URL")
         self._api_key = os.getenv("BING_SEARCH_API_KEY")
 
@@ -118,18 +140,17 @@ class BingSearch(SearchBase):
 
     async def search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
         body = self.construct_body(query, request_id)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
-                result = json.loads(await response.text())
-                return [
-                    Doc(
-                        doc_type="web_page",
-                        content=item.get("snippet", ""),
-                        title=item.get("name", ""),
-                        link=item.get("url", ""),
-                        data={"search_engine": self._engine},
-                    ) for item in result.get("webPages", {}).get("value", [])
-                ]
+        async with HttpClient.session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
+            result = json.loads(await response.text())
+            return [
+                Doc(
+                    doc_type="web_page",
+                    content=item.get("snippet", ""),
+                    title=item.get("name", ""),
+                    link=item.get("url", ""),
+                    data={"search_engine": self._engine},
+                ) for item in result.get("webPages", {}).get("value", [])
+            ]
 
 
 class JinaSearch(BingSearch):
@@ -137,6 +158,7 @@ class JinaSearch(BingSearch):
     def __init__(self):
         super().__init__()
         self._engine = "search_pro_jina"
+        self._rate_limiter = engine_rate_limiter(self._engine, "JINA_SEARCH")
         self._url = os.getenv("JINA_SEARCH_URL")
         self._api_key = os.getenv("JINA_SEARCH_API_KEY")
 
@@ -144,35 +166,33 @@ class JinaSearch(BingSearch):
     async def search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
         if self._use_jd_gateway:
             body = self.construct_body(query, request_id)
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
-                    result = json.loads(await response.text())
-                    return [
-                        Doc(
-                            doc_type="web_page",
-                            content=item.get("content", ""),
-                            title=item.get("title", ""),
-                            link=item.get("link", ""),
-                            data={"search_engine": self._engine},
-                        ) for item in result.get("search_result", [])
-                    ]
+            async with HttpClient.session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
+                result = json.loads(await response.text())
+                return [
+                    Doc(
+                        doc_type="web_page",
+                        content=item.get("content", ""),
+                        title=item.get("title", ""),
+                        link=item.get("link", ""),
+                        data={"search_engine": self._engine},
+                    ) for item in result.get("search_result", [])
+                ]
         else:
             headers = {
                 "Accept": "application/json",
                 "Authorization": f"Bearer {self._api_key}"
             }
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self._url}?q={query}", headers=headers, timeout=self._timeout) as response:
-                    result = json.loads(await response.text())
-                    return [
-                        Doc(
-                            doc_type="web_page",
-                            content=item.get("content", ""),
-                            title=item.get("title", ""),
-                            link=item.get("url", ""),
-                            data={"search_engine": self._engine},
-                        ) for item in result.get("data", [])
-                    ]
+            async with HttpClient.session.get(f"{self._url}?q={query}", headers=headers, timeout=self._timeout) as response:
+                result = json.loads(await response.text())
+                return [
+                    Doc(
+                        doc_type="web_page",
+                        content=item.get("content", ""),
+                        title=item.get("title", ""),
+                        link=item.get("url", ""),
+                        data={"search_engine": self._engine},
+                    ) for item in result.get("data", [])
+                ]
 
 
 class SogouSearch(JinaSearch):
@@ -180,6 +200,7 @@ class SogouSearch(JinaSearch):
     def __init__(self):
         super().__init__()
         self._engine = "search_pro_sogou"
+        self._rate_limiter = engine_rate_limiter(self._engine, "SOGOU_SEARCH")
         self._url = os.getenv("SOGOU_SEARCH_URL")
         self._api_key = os.getenv("SOGOU_SEARCH_API_KEY")
 
@@ -189,6 +210,7 @@ class SerperSearch(JinaSearch):
     def __init__(self):
         super().__init__()
         self._engine = "serper"
+        self._rate_limiter = engine_rate_limiter(self._engine, "SERPER_SEARCH")
         self._url = os.getenv("SERPER_SEARCH_URL")
         self._api_key = os.getenv("SERPER_SEARCH_API_KEY")
         self.set_auth()
@@ -204,22 +226,25 @@ class SerperSearch(JinaSearch):
     
     async def search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
         body = self.construct_body(query, request_id)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
-                result = json.loads(await response.text())
-                return [
-                    Doc(
-                        doc_type="web_page",
-                        content=item.get("snippet", ""),
-                        title=item.get("title", ""),
-                        link=item.get("link", ""),
-                        data={"search_engine": self._engine},
-                    ) for item in result.get("organic", [])
-                ]
+        async with HttpClient.session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
+            result = json.loads(await response.text())
+            return [
+                Doc(
+                    doc_type="web_page",
+                    content=item.get("snippet", ""),
+                    title=item.get("title", ""),
+                    link=item.get("link", ""),
+                    data={"search_engine": self._engine},
+                ) for item in result.get("organic", [])
+            ]
 
 
 class MixSearch(BingSearch):
 
+    # 由各个子引擎分别缓存、分别保护
+    _use_cache = False
+    _use_guard = False
+
     def __init__(self):
         super().__init__()
         self._engine = "mix_search"
@@ -242,8 +267,40 @@ class MixSearch(BingSearch):
             engines.append(self._sogou_engine)
         if use_serp:
             engines.append(self._serp_engine)
-        async with asyncio.TaskGroup() as tg:
-            tasks = [tg.create_task(engine.search_and_dedup(query=query, request_id=request_id)) for engine in engines]
-        results = [task.result() for task in tasks]
-        return [doc for docs in results for doc in docs]
+        # 单个引擎失败不影响其他引擎，返回部分结果
+        results = await asyncio.gather(
+            *[engine.cached_search(query=query, request_id=request_id) for engine in engines], return_exceptions=True)
+        docs = []
+        for engine, result in zip(engines, results):
+            if isinstance(result, Exception):
+                logger.warning(f"{request_id} mix search engine [{engine._engine}] error: {result!r}")
+                continue
+            docs.extend(result)
+        merged_docs = self.merge_by_url(docs)
+        logger.info(f"{request_id} mix search merge by url: {len(docs)} -> {len(merged_docs)} docs, "
+                    f"engines={EngineGuard.stats()}")
+        return merged_docs
 
+    @staticmethod
+    def merge_by_url(docs: List[Doc]) -> List[Doc]:
+        """按归一化 URL 合并多个引擎返回的同一页面，保证每个页面只抓取一次，并记录所有来源引擎"""
+        merged = {}
+        merged_docs = []
+        for doc in docs:
+            engine = doc.data.get("search_engine", "")
+            key = canonicalize_url(doc.link)
+            if not key:
+                doc.data["search_engines"] = [engine]
+                merged_docs.append(doc)
+                continue
+            if (exist := merged.get(key)) is None:
+                doc.data["search_engines"] = [engine]
+                merged[key] = doc
+                merged_docs.append(doc)
+                continue
+            if engine not in exist.data["search_engines"]:
+                exist.data["search_engines"].append(engine)
+            if len(doc.content or "") > len(exist.content or ""):
+                exist.content = doc.content
+            exist.title = exist.title or doc.title
+        return merged_docs
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import asyncio
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+
+def normalize_query(query: str) -> str:
+    """query 归一化：全角转半角、小写、合并空白、去除首尾标点"""
+    query = unicodedata.normalize("NFKC", query or "").lower()
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" \t\r\n,.;:!?，。；：！？、")
+
+
+class TTLCache(object):
+    """带 TTL 的 LRU 缓存
+
+    内存层为进程内 LRU（按条数 max_size 和字节数 max_bytes 限制）；配置 disk_path 后额外启用 SQLite 磁盘层，
+    重启后保留，并可被同一台机器上的多个 worker 共享。写入磁盘层的 value 需要可以 json 序列化。
+    """
+
+    def __init__(
+            self,
+            name: str,
+            ttl: int = 600,
+            max_size: int = 1000,
+            disk_path: Optional[str] = None,
+            disk_max_size: int = 100000,
+            enable: bool = True,
+            stale_ttl: int = 0,
+            max_bytes: int = 0,
+            disk_max_bytes: int = 0,
+            sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.name = name
+        self.enable = enable
+        self._ttl = ttl
+        # 过期后仍保留 stale_ttl 秒，供调用方做条件请求重新校验
+        self._stale_ttl = stale_ttl
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda v: len(json.dumps(v, ensure_ascii=False)))
+        self._disk_path = disk_path
+        self._disk_max_size = disk_max_size
+        self._disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_ready = False
+        self._disk_writes = 0
+        self._stats = {"hits": 0, "stale_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def stats(self) -> dict:
+        return {"name": self.name, "size": len(self._memory), "bytes": self._memory_bytes, **self._stats}
+
+    async def get(self, key: str) -> Any:
+        entry = await self.get_entry(key, allow_stale=False)
+        return entry[0] if entry else None
+
+    async def get_entry(self, key: str, allow_stale: bool = True) -> Optional[tuple[Any, bool]]:
+        """返回 (value, 是否未过期)；allow_stale 时可能返回 stale_ttl 窗口内的过期数据"""
+        if not self.enable:
+            return None
+        now = time.time()
+        if (item := self._memory.get(key)) is not None:
+            expire_at, value, _ = item
+            if expire_at > now or (allow_stale and expire_at + self._stale_ttl > now):
+                self._memory.move_to_end(key)
+                self._stats["hits" if expire_at > now else "stale_hits"] += 1
+                return value, expire_at > now
+            if expire_at + self._stale_ttl <= now:
+                self._memory_pop(key)
+        if self._disk_path:
+            try:
+                row = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.warning(f"cache[{self.name}] disk get error: {e}")
+                row = None
+            if row and (row[0] > now or (allow_stale and row[0] + self._stale_ttl > now)):
+                value = json.loads(row[1])
+                self._memory_set(key, value, row[0])
+                self._stats["disk_hits"] += 1
+                return value, row[0] > now
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if not self.enable:
+            return
+        expire_at = time.time() + (ttl or self._ttl)
+        self._memory_set(key, value, expire_at)
+        self._stats["sets"] += 1
+        if self._disk_path:
+            try:
+                await asyncio.to_thread(self._disk_set, key, json.dumps(value, ensure_ascii=False), expire_at)
+            except Exception as e:
+                logger.warning(f"cache[{self.name}] disk set error: {e}")
+
+    def _memory_set(self, key: str, value: Any, expire_at: float):
+        size = self._sizeof(value) if self._max_bytes > 0 else 0
+        self._memory_pop(key)
+        self._memory[key] = (expire_at, value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self._max_size or (0 < self._max_bytes < self._memory_bytes and len(self._memory) > 1):
+            self._memory_pop(next(iter(self._memory)))
+            self._stats["evictions"] += 1
+
+    def _memory_pop(self, key: str):
+        if (item := self._memory.pop(key, None)) is not None:
+            self._memory_bytes -= item[2]
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._disk_path, timeout=5)
+        if not self._disk_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv_cache ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expire_at REAL NOT NULL, access_at REAL NOT NULL, PRIMARY KEY (name, key))")
+            conn.commit()
+            self._disk_ready = True
+        return conn
+
+    def _disk_get(self, key: str) -> Optional[tuple[float, str]]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT expire_at, value FROM kv_cache WHERE name = ? AND key = ?", (self.name, key)).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE kv_cache SET access_at = ? WHERE name = ? AND key = ?", (time.time(), self.name, key))
+                conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def _disk_set(self, key: str, value: str, expire_at: float):
+        conn = self._connect()
+        try:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO kv_cache (name, key, value, expire_at, access_at) VALUES (?, ?, ?, ?, ?)",
+                (self.name, key, value, expire_at, now))
+            self._disk_writes += 1
+            # 周期性清理过期数据，并按最近访问时间淘汰超出容量的数据
+            if self._disk_writes % 100 == 0:
+                conn.execute(
+                    "DELETE FROM kv_cache WHERE name = ? AND expire_at < ?", (self.name, now - self._stale_ttl))
+                conn.execute(
+                    "DELETE FROM kv_cache WHERE name = ? AND key IN ("
+                    "SELECT key FROM kv_cache WHERE name = ? ORDER BY access_at DESC LIMIT -1 OFFSET ?)",
+                    (self.name, self.name, self._disk_max_size))
+                if self._disk_max_bytes > 0:
+                    conn.execute(
+                        "DELETE FROM kv_cache WHERE name = ? AND key IN (SELECT key FROM ("
+                        "SELECT key, SUM(LENGTH(value)) OVER (ORDER BY access_at DESC) AS acc_bytes "
+                        "FROM kv_cache WHERE name = ?) WHERE acc_bytes > ?)",
+                        (self.name, self.name, self._disk_max_bytes))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    pass
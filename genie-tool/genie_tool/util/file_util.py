@@ -9,13 +9,14 @@ import secrets
 import string
 import json
 import os
-from copy import deepcopy
+from dataclasses import replace
 from typing import List, Dict, Any
 
 import aiohttp
 from loguru import logger
 
 from genie_tool.util.log_util import timer
+from genie_tool.util.token_util import count_tokens, truncate_tokens
 from genie_tool.model.document import Doc
 
 
@@ -62,23 +63,24 @@ async def download_all_files(file_names: list[str]) -> List[Dict[str, Any]]:
 
 @timer()
 def truncate_files(
-    files: List[Dict[str, Any]] | List[Doc], max_tokens: int
+    files: List[Dict[str, Any]] | List[Doc], max_tokens: int, model: str = None
 ) -> List[Dict[str, Any]] | List[Doc]:
-    """近似计算 token 数"""
+    """按 model 对应的 tokenizer 计算 token 数截断
+
+    不拷贝输入：预算内的文件原样返回（保持对象和 unique_id 不变），只有最后一个被截断的文件浅拷贝后替换 content。
+    """
     truncated_files = []
     token_size = 0
-    for f_a in files:
-        f = deepcopy(f_a)
+    for f in files:
         if token_size >= max_tokens:
             break
-        if isinstance(f, Doc):
-            dct = f.to_dict()
-            dct["content"] = dct["content"][: max_tokens - token_size]
-            token_size += len(dct["content"] or "")
-            f = Doc(**dct)
-        else:
-            f["content"] = f["content"][: max_tokens - token_size]
-            token_size += len(f.get("content", ""))
+        content = (f.content if isinstance(f, Doc) else f.get("content")) or ""
+        tokens = count_tokens(content, model)
+        if token_size + tokens > max_tokens:
+            content = truncate_tokens(content, max_tokens - token_size, model)
+            tokens = count_tokens(content, model)
+            f = replace(f, content=content) if isinstance(f, Doc) else {**f, "content": content}
+        token_size += tokens
         truncated_files.append(f)
     return truncated_files
 
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import asyncio
+import os
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+
+class _HttpClient(object):
+    """进程级共享 HTTP 连接池（搜索引擎请求和网页抓取共用）
+
+    每个 uvicorn worker 进程只维护一个 ClientSession，复用 keep-alive 连接并缓存 DNS 解析结果，
+    避免每次请求都重新建立 TCP / TLS 连接。session 与创建它的事件循环绑定，事件循环变化时自动重建。
+    """
+
+    def __init__(self):
+        self._limit = int(os.getenv("HTTP_POOL_LIMIT", 100))
+        self._limit_per_host = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 10))
+        self._dns_cache_ttl = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+        self._keepalive_timeout = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self._dns_cache_ttl,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+            logger.info(f"http pool created: limit={self._limit} limit_per_host={self._limit_per_host}")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+HttpClient = _HttpClient()
+
+
+async def close_http_client():
+    await HttpClient.close()
+
+
+if __name__ == "__main__":
+    pass
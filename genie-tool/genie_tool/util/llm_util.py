@@ -5,6 +5,7 @@
 # Author: liumin.423
 # Date:   2025/7/8
 # =====================
+import inspect
 import json
 import os
 from typing import List, Any, Optional
@@ -49,15 +50,33 @@ async def ask_llm(
     )
     async with AsyncTimer(key=f"exec ask_llm"):
         if stream:
-            async for chunk in response:
-                if only_content:
-                    if chunk.choices and chunk.choices[0] and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-                else:
-                    yield chunk
+            try:
+                async for chunk in response:
+                    if only_content:
+                        if chunk.choices and chunk.choices[0] and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                    else:
+                        yield chunk
+            finally:
+                # 调用方提前结束（aclose / 取消）时关闭 HTTP 流，让服务端停止生成
+                await _close_stream(response)
         else:
             yield response.choices[0].message.content if only_content else response
 
 
+async def _close_stream(response):
+    """关闭 litellm 流式响应；旧版本 CustomStreamWrapper 没有 aclose，关闭其底层的 completion_stream"""
+    for stream in (response, getattr(response, "completion_stream", None)):
+        close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+        if close is None:
+            continue
+        try:
+            if inspect.isawaitable(result := close()):
+                await result
+        except Exception:
+            pass
+        return
+
+
 if __name__ == "__main__":
     pass
@@ -40,7 +40,8 @@ class AsyncTimer(object):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if exc_type is not None:
+        # GeneratorExit: 流式调用方提前关闭了生成器，不是错误
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
             logger.error(f"{RequestIdCtx.request_id} {self.key} error={traceback.format_exc()}")
         else:
             logger.info(f"{RequestIdCtx.request_id} {self.key} cost=[{int((time.time() - self.start_time) * 1000)} ms]")
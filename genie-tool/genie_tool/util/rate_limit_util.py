@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+
+class RateLimiter(object):
+    """令牌桶 QPS 限制 + 并发租约限制
+
+    配置 db_path 后令牌桶和租约保存在 SQLite 中，同一台机器上的所有 worker 共享额度；否则只在进程内生效。
+    租约带过期时间，worker 异常退出时占用的并发额度在 lease_ttl 秒后自动回收。
+    进程内按 FIFO 排队（asyncio.Lock 按等待顺序唤醒），只有队首请求轮询共享额度，超出额度时排队等待而不是失败。
+    """
+
+    def __init__(
+            self,
+            name: str,
+            qps: float = 0,
+            concurrency: int = 0,
+            burst: Optional[float] = None,
+            db_path: Optional[str] = None,
+            lease_ttl: float = 60,
+    ):
+        self.name = name
+        self._qps = qps
+        self._concurrency = concurrency
+        self._burst = burst or max(qps, 1)
+        self._db_path = db_path
+        self._lease_ttl = lease_ttl
+        self._queue_lock = asyncio.Lock()
+        self._queued = 0
+        self._db_ready = False
+        # 进程内状态，未配置 db_path 时使用
+        self._tokens = self._burst
+        self._updated_at = time.time()
+        self._leases: dict[str, float] = {}
+        self._waits = deque(maxlen=1000)
+        self._stats = {"acquired": 0, "waited": 0, "wait_ms_max": 0}
+
+    @property
+    def enable(self) -> bool:
+        return self._qps > 0 or self._concurrency > 0
+
+    def stats(self) -> dict:
+        waits = np.array(self._waits or [0.0]) * 1000
+        return {
+            "name": self.name, "queued": self._queued, **self._stats,
+            "wait_ms_avg": int(waits.mean()), "wait_ms_p95": int(np.percentile(waits, 95)),
+        }
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self.enable:
+            yield
+            return
+        start = time.monotonic()
+        self._queued += 1
+        try:
+            async with self._queue_lock:
+                while True:
+                    lease_id, wait = await self._try_acquire()
+                    if lease_id is not None:
+                        break
+                    await asyncio.sleep(wait)
+        finally:
+            self._queued -= 1
+        self._record_wait(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            await self._release(lease_id)
+
+    @asynccontextmanager
+    async def try_acquire(self):
+        """不排队：当前有额度时获取并 yield True，否则 yield False（不占用额度）"""
+        if not self.enable:
+            yield True
+            return
+        # 已有请求在排队时不插队
+        lease_id = None if self._queue_lock.locked() else (await self._try_acquire())[0]
+        if lease_id is None:
+            yield False
+            return
+        self._record_wait(0)
+        try:
+            yield True
+        finally:
+            await self._release(lease_id)
+
+    def _record_wait(self, wait: float):
+        self._waits.append(wait)
+        self._stats["acquired"] += 1
+        if wait > 0.01:
+            self._stats["waited"] += 1
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], int(wait * 1000))
+            logger.info(f"rate limiter[{self.name}] queued {int(wait * 1000)} ms, stats={self.stats()}")
+
+    async def _try_acquire(self) -> Tuple[Optional[str], float]:
+        """返回 (租约 id, 0) 或 (None, 建议等待秒数)"""
+        if not self._db_path:
+            return self._acquire(time.time())
+        try:
+            return await asyncio.to_thread(self._db_acquire)
+        except Exception as e:
+            # 共享存储不可用时不阻塞搜索
+            logger.warning(f"rate limiter[{self.name}] db error: {e}")
+            return "", 0
+
+    async def _release(self, lease_id: str):
+        if not lease_id:
+            return
+        if not self._db_path:
+            self._leases.pop(lease_id, None)
+            return
+        try:
+            await asyncio.to_thread(self._db_release, lease_id)
+        except Exception as e:
+            logger.warning(f"rate limiter[{self.name}] db error: {e}")
+
+    def _acquire(self, now: float) -> Tuple[Optional[str], float]:
+        self._leases = {k: v for k, v in self._leases.items() if v > now}
+        if self._qps > 0:
+            self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._qps)
+            self._updated_at = now
+            if self._tokens < 1:
+                return None, (1 - self._tokens) / self._qps
+        if 0 < self._concurrency <= len(self._leases):
+            return None, 0.05
+        if self._qps > 0:
+            self._tokens -= 1
+        lease_id = uuid.uuid4().hex
+        self._leases[lease_id] = now + self._lease_ttl
+        return lease_id, 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path, timeout=5, isolation_level=None)
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_bucket ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_lease ("
+                "lease_id TEXT PRIMARY KEY, name TEXT NOT NULL, expire_at REAL NOT NULL)")
+            self._db_ready = True
+        return conn
+
+    def _db_acquire(self) -> Tuple[Optional[str], float]:
+        conn = self._connect()
+        try:
+            # 写锁保证多个 worker 的读-改-写是原子的
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            conn.execute("DELETE FROM rate_lease WHERE name = ? AND expire_at <= ?", (self.name, now))
+            row = conn.execute("SELECT tokens, updated_at FROM rate_bucket WHERE name = ?", (self.name,)).fetchone()
+            tokens = min(self._burst, row[0] + (now - row[1]) * self._qps) if row else self._burst
+            lease_id, wait = None, 0.0
+            if self._qps > 0 and tokens < 1:
+                wait = (1 - tokens) / self._qps
+            elif 0 < self._concurrency <= conn.execute(
+                    "SELECT COUNT(*) FROM rate_lease WHERE name = ?", (self.name,)).fetchone()[0]:
+                wait = 0.05
+            else:
+                if self._qps > 0:
+                    tokens -= 1
+                lease_id = uuid.uuid4().hex
+                conn.execute("INSERT INTO rate_lease (lease_id, name, expire_at) VALUES (?, ?, ?)",
+                             (lease_id, self.name, now + self._lease_ttl))
+            conn.execute("INSERT OR REPLACE INTO rate_bucket (name, tokens, updated_at) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+            return lease_id, wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _db_release(self, lease_id: str):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM rate_lease WHERE lease_id = ?", (lease_id,))
+        finally:
+            conn.close()
+
+
+_ENGINE_RATE_LIMITERS: dict[str, RateLimiter] = {}
+
+
+def engine_rate_limiter(engine: str, env_prefix: str) -> RateLimiter:
+    """按 {env_prefix}_QPS / {env_prefix}_CONCURRENCY 获取搜索引擎限流器（进程内单例），均为 0 时不限流"""
+    if engine not in _ENGINE_RATE_LIMITERS:
+        _ENGINE_RATE_LIMITERS[engine] = RateLimiter(
+            name=engine,
+            qps=float(os.getenv(f"{env_prefix}_QPS", 0)),
+            concurrency=int(os.getenv(f"{env_prefix}_CONCURRENCY", 0)),
+            burst=float(os.getenv(f"{env_prefix}_BURST", 0)) or None,
+            db_path=os.getenv("SEARCH_RATE_LIMIT_DB_PATH") or None,
+            lease_ttl=float(os.getenv("SEARCH_RATE_LIMIT_LEASE_TTL", 60)),
+        )
+    return _ENGINE_RATE_LIMITERS[engine]
+
+
+if __name__ == "__main__":
+    pass
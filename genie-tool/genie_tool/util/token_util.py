@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from functools import partial
+from typing import Optional
+
+from litellm import token_counter
+from loguru import logger
+
+from genie_tool.model.context import LLMModelInfoFactory
+
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+# 短文本直接计算，不进缓存
+_CACHE_MIN_LENGTH = 256
+
+
+def approx_tokens(text: str) -> int:
+    """近似 token 数：中日文字符（含全角标点）按 1 个 token，其余字符按 4 个字符 1 个 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class _TokenCounter(object):
+    """token 计数服务
+
+    按模型注册的 tokenizer（见 LLMModelInfo.tokenizer，未注册时使用模型名，由 litellm 选择对应 tokenizer）计算 token 数，
+    同一文档在多轮 / 多次截断中反复计数，结果按 (tokenizer, 内容 md5) 做 LRU 缓存。
+    TOKEN_COUNT_MODE=approx 时使用近似计数，不加载 tokenizer。
+    """
+
+    def __init__(self):
+        self._approx = os.getenv("TOKEN_COUNT_MODE", "exact") == "approx"
+        self._max_size = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 20000))
+        self._cache: OrderedDict[tuple, int] = OrderedDict()
+
+    def _tokenizer(self, model: Optional[str]) -> str:
+        return LLMModelInfoFactory.get_tokenizer(model) or "gpt-4.1"
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        if not text:
+            return 0
+        if self._approx:
+            return approx_tokens(text)
+        tokenizer = self._tokenizer(model)
+        if len(text) < _CACHE_MIN_LENGTH:
+            return self._count(text, tokenizer)
+        key = (tokenizer, hashlib.md5(text.encode("utf-8")).hexdigest())
+        if (value := self._cache.get(key)) is not None:
+            self._cache.move_to_end(key)
+            return value
+        value = self._count(text, tokenizer)
+        self._cache[key] = value
+        if len(self._cache) > self._max_size:
+            self._cache.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _count(text: str, tokenizer: str) -> int:
+        try:
+            return token_counter(model=tokenizer, text=text)
+        except Exception as e:
+            logger.warning(f"token count error: tokenizer=[{tokenizer}] error={e}")
+            return approx_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int, model: Optional[str] = None) -> str:
+        """截断到不超过 max_tokens 个 token
+
+        先按 token / 字符比例估计截断位置，再在估计值附近二分，只对前缀计数，开销与预算而非全文长度相关。
+        """
+        if max_tokens <= 0 or not text:
+            return ""
+        tokens = self.count(text, model)
+        if tokens <= max_tokens:
+            return text
+        if self._approx:
+            count = approx_tokens
+        else:
+            tokenizer = self._tokenizer(model)
+            count = partial(self._count, tokenizer=tokenizer)
+
+        lo, hi = 0, len(text)
+        estimate = len(text) * max_tokens // tokens
+        for probe in (estimate, estimate * 11 // 10):
+            if not lo < probe < hi:
+                continue
+            if count(text[:probe]) <= max_tokens:
+                lo = probe
+            else:
+                hi = probe
+                break
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if count(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid
+        return text[:lo]
+
+
+TokenCounter = _TokenCounter()
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    return TokenCounter.count(text, model)
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    return TokenCounter.truncate(text, max_tokens, model)
+
+
+if __name__ == "__main__":
+    pass
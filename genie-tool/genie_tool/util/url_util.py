@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author:
+# Date:   2026/10/18
+# =====================
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# 不影响页面内容的跟踪参数
+_TRACKING_PARAMS = {
+    "gclid", "fbclid", "msclkid", "yclid", "igshid", "spm", "scm", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "ref_src", "share_token", "from_source",
+}
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name.startswith("utm_") or name in _TRACKING_PARAMS
+
+
+def canonicalize_url(url: str) -> str:
+    """URL 归一化，用于判断多个链接是否指向同一页面
+
+    http / https 统一为 https，host 小写并去掉 www. 前缀和默认端口，去掉 fragment、跟踪参数和末尾的 /，
+    其余 query 参数按名称排序。
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if not host:
+        return url
+    if scheme in _DEFAULT_PORTS:
+        if port == _DEFAULT_PORTS[scheme]:
+            port = None
+        scheme = "https"
+    if host.startswith("www."):
+        host = host[len("www."):]
+    netloc = host if port is None else f"{host}:{port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _is_tracking_param(k)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+if __name__ == "__main__":
+    pass
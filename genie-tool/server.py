@@ -33,8 +33,13 @@ def log_setting():
 
 
 def create_app() -> FastAPI:
+    # 连接池 / 进程池单例在导入时读取环境变量，需在 load_dotenv 之后导入
+    from genie_tool.util.http_util import close_http_client
+    from genie_tool.tool.search_component.html_extractor import shutdown_html_extract_pool
+
     _app = FastAPI(
-        on_startup=[log_setting, print_logo]
+        on_startup=[log_setting, print_logo],
+        on_shutdown=[close_http_client, shutdown_html_extract_pool],
     )
 
     register_middleware(_app)
@@ -59,7 +64,9 @@ def register_router(app: FastAPI):
     app.include_router(api_router)
 
 
-app = create_app()
+# multiprocessing 子进程（如正文抽取进程池）会以 __mp_main__ 重新执行本文件，此时不创建 app，避免子进程导入整个服务
+if __name__ != "__mp_main__":
+    app = create_app()
 
 
 if __name__ == "__main__":